@@ -7,15 +7,16 @@ REST API for object tracking in videos
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-import cv2
 import torch
 import numpy as np
 import tempfile
 import os
-import subprocess
-import shutil
 from pathlib import Path
-from siamrpn import TrackerSiamRPN
+from typing import Optional
+from siamrpn import TrackerSiamRPN, PROFILES
+from kernel_cache import KernelCache
+import pipeline
+from pipeline import OUTPUT_FORMATS
 import logging
 
 # Configure logging
@@ -42,9 +43,15 @@ app.add_middleware(
 
 # Model configuration
 MODEL_PATH = "model.pth"
+# Tracking checkpoints, so a retried job resumes where it stopped (unset disables)
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR")
+# Initialised tracker states reused across requests for the same video and box
+KERNEL_CACHE_BYTES = 256 * 1024 * 1024
+kernel_cache = KernelCache(KERNEL_CACHE_BYTES)
 tracker = None
 device = None
 
+
 def load_tracker():
     """Load the SiamRPN tracker with GPU support"""
     global tracker, device
@@ -57,138 +64,32 @@ def load_tracker():
         logger.info(f"✓ Tracker loaded on {device}")
     return tracker
 
-def process_video_tracking(video_path: str, bbox_x: int, bbox_y: int, 
-                          bbox_w: int, bbox_h: int):
+def process_video_tracking(video_path: str, bbox_x: int, bbox_y: int,
+                          bbox_w: int, bbox_h: int, **options):
     """
     Process video with object tracking
     
     Args:
         video_path: Path to input video
         bbox_x, bbox_y, bbox_w, bbox_h: Bounding box coordinates
+        **options: Rendering, profile, range and output options, see
+            pipeline.process_video
         
     Returns:
         tuple: (output_path, message, metadata)
     """
     try:
         tracker_instance = load_tracker()
-        
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            return None, "Could not open video file", None
-        
-        # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        if fps == 0:
-            fps = 30
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        logger.info(f"Video: {width}x{height} @ {fps}fps, {total_frames} frames")
-        
-        ret, frame = cap.read()
-        if not ret:
-            return None, "Could not read first frame", None
-        
-        # Validate bounding box
-        if bbox_w <= 0 or bbox_h <= 0:
-            return None, "Invalid bounding box dimensions", None
-        
-        if (bbox_x < 0 or bbox_y < 0 or 
-            bbox_x + bbox_w > width or bbox_y + bbox_h > height):
-            return None, f"Bounding box out of bounds (frame: {width}x{height})", None
-        
-        bbox = [bbox_x, bbox_y, bbox_w, bbox_h]
-        
-        # Initialize tracker
-        tracker_instance.init(frame, bbox)
-        
-        # Create temporary output file
-        temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='_temp.mp4')
-        temp_output.close()
-        
-        # Use XVID codec for initial write
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        writer = cv2.VideoWriter(temp_output.name, fourcc, fps, (width, height))
-        
-        if not writer.isOpened():
-            return None, "Could not create video writer", None
-        
-        # Draw first frame with initial bbox
-        x, y, w, h = [int(v) for v in bbox]
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 3)
-        cv2.putText(frame, 'Frame: 1', (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        writer.write(frame)
-        
-        # Process remaining frames
-        frame_count = 1
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Update tracker
-            bbox = tracker_instance.update(frame)
-            
-            # Draw tracking result
-            x, y, w, h = [int(v) for v in bbox]
-            x = max(0, min(x, width - 1))
-            y = max(0, min(y, height - 1))
-            w = max(1, min(w, width - x))
-            h = max(1, min(h, height - y))
-            
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 3)
-            cv2.putText(frame, f'Frame: {frame_count}', (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            writer.write(frame)
-            
-            if frame_count % 30 == 0:
-                logger.info(f"Processed {frame_count}/{total_frames} frames")
-        
-        cap.release()
-        writer.release()
-        
-        # Re-encode with H.264 for browser compatibility
-        final_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        final_output.close()
-        
-        try:
-            logger.info("Re-encoding video for browser compatibility...")
-            subprocess.run([
-                'ffmpeg', '-i', temp_output.name,
-                '-c:v', 'libx264',
-                '-preset', 'fast',
-                '-crf', '23',
-                '-pix_fmt', 'yuv420p',
-                '-movflags', '+faststart',
-                '-y',
-                final_output.name
-            ], check=True, capture_output=True, text=True)
-            
-            os.unlink(temp_output.name)
-            logger.info("✓ Video re-encoded successfully")
-            
-        except (subprocess.CalledProcessError, FileNotFoundError) as e:
-            logger.warning(f"FFmpeg encoding failed: {e}, using original")
-            shutil.move(temp_output.name, final_output.name)
-        
-        metadata = {
-            'frames_processed': frame_count,
-            'resolution': f"{width}x{height}",
-            'fps': fps,
-            'device': str(device)
-        }
-        
-        return final_output.name, f"Successfully tracked {frame_count} frames", metadata
-        
     except Exception as e:
         logger.error(f"Tracking error: {str(e)}")
         return None, f"Error: {str(e)}", None
+    
+    output_path, message, metadata = pipeline.process_video(
+        tracker_instance, video_path, bbox_x, bbox_y, bbox_w, bbox_h,
+        checkpoint_dir=CHECKPOINT_DIR, kernel_cache=kernel_cache, **options)
+    if metadata is not None:
+        metadata['device'] = str(device)
+    return output_path, message, metadata
 
 
 @app.get("/health")
@@ -200,7 +101,8 @@ async def health_check():
         'status': 'healthy',
         'gpu_available': torch.cuda.is_available(),
         'gpu_name': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
-        'model_loaded': tracker is not None
+        'model_loaded': tracker is not None,
+        'kernel_cache': kernel_cache.stats()
     })
 
 
@@ -210,7 +112,17 @@ async def track_video(
     bbox_x: int = Form(..., description="X coordinate of bounding box"),
     bbox_y: int = Form(..., description="Y coordinate of bounding box"),
     bbox_w: int = Form(..., description="Width of bounding box"),
-    bbox_h: int = Form(..., description="Height of bounding box")
+    bbox_h: int = Form(..., description="Height of bounding box"),
+    render: str = Form("opencv", description="Overlay renderer: opencv or ffmpeg"),
+    decode_scale: float = Form(1.0, description="Decode resolution factor for the ffmpeg renderer"),
+    profile: str = Form("balanced", description="Tracker profile: fast, balanced or accurate"),
+    start_frame: Optional[int] = Form(None, description="First frame to track (0-indexed)"),
+    end_frame: Optional[int] = Form(None, description="Last frame to track (included)"),
+    start_time: Optional[float] = Form(None, description="Start of segment in seconds"),
+    end_time: Optional[float] = Form(None, description="End of segment in seconds"),
+    output: str = Form("video", description="Output: video, json or vtrk"),
+    adaptive: bool = Form(False, description="Motion-adaptive search region"),
+    decoder: str = Form("inline", description="Frame decoding: inline or process")
 ):
     """
     Main tracking endpoint
@@ -237,21 +149,30 @@ async def track_video(
         
         # Process video
         output_path, message, metadata = process_video_tracking(
-            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h
+            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h,
+            render=render, decode_scale=decode_scale, profile=profile,
+            start_frame=start_frame, end_frame=end_frame,
+            start_time=start_time, end_time=end_time, output=output,
+            adaptive=adaptive, decoder=decoder
         )
         
         if output_path is None:
             raise HTTPException(status_code=400, detail=message)
         
-        # Return processed video
+        # Return processed video or track data
+        media_type, filename = OUTPUT_FORMATS[output]
         return FileResponse(
             output_path,
-            media_type='video/mp4',
-            filename='tracked_video.mp4',
+            media_type=media_type,
+            filename=filename,
             headers={
                 'X-Frames-Processed': str(metadata['frames_processed']),
+                'X-Start-Frame': str(metadata['start_frame']),
                 'X-Resolution': metadata['resolution'],
-                'X-FPS': str(metadata['fps'])
+                'X-FPS': str(metadata['fps']),
+                'X-Profile': metadata['profile'],
+                'X-Render': metadata['render'],
+                'X-Kernel-Cache': metadata['kernel_cache']
             }
         )
         
@@ -294,7 +215,17 @@ async def get_info():
                 'bbox_x': 'X coordinate (int)',
                 'bbox_y': 'Y coordinate (int)',
                 'bbox_w': 'Width (int)',
-                'bbox_h': 'Height (int)'
+                'bbox_h': 'Height (int)',
+                'render': 'Overlay renderer: opencv (default) or ffmpeg, which needs ffmpeg with drawbox/drawtext/sendcmd (optional)',
+                'decode_scale': 'Tracking-pass resolution factor in (0, 1], ffmpeg renderer only (optional)',
+                'profile': f"Tracker profile: {', '.join(PROFILES)} (optional, default balanced)",
+                'start_frame': 'First frame to track, 0-indexed; the bbox refers to this frame (optional)',
+                'end_frame': 'Last frame to track, included (optional)',
+                'start_time': 'Start of segment in seconds, if start_frame is not given (optional)',
+                'end_time': 'End of segment in seconds, if end_frame is not given (optional)',
+                'output': 'video (default), json (track JSON) or vtrk (compact binary track) (optional)',
+                'adaptive': 'Shrink the search region while the target moves slowly (bool, optional)',
+                'decoder': 'inline (default) or process: decode in a separate process through shared memory (optional)'
             }
         },
         'example_curl': '''
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+FLOPs saved and accuracy impact of the motion-adaptive search region
+
+Runs every train video with a fixed search region and with
+adaptive_search=True, and prints per-frame inference GFLOPs, success rate
+and mean IoU for both.
+
+Usage:
+    python benchmarks/adaptive_search.py [--model model.pth] [--profile balanced]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from siamrpn import TrackerSiamRPN, PROFILES
+from train_eval import find_sequences, evaluate
+
+
+def inference_flops(tracker, instance_sz):
+    """Multiply-accumulates of one SiamRPN.inference call, times two"""
+    macs = []
+
+    def count(module, inputs, output):
+        k = module.kernel_size[0] * module.kernel_size[1]
+        macs.append(output.numel() * module.in_channels // module.groups * k)
+
+    hooks = [m.register_forward_hook(count)
+             for m in tracker.net.modules() if isinstance(m, nn.Conv2d)]
+    try:
+        with torch.no_grad():
+            exemplar = torch.zeros(1, 3, tracker.cfg.exemplar_sz,
+                                   tracker.cfg.exemplar_sz, device=tracker.device)
+            kernel_reg, kernel_cls = tracker.net.learn(exemplar)
+            del macs[:]
+            instance = torch.zeros(1, 3, instance_sz, instance_sz,
+                                   device=tracker.device)
+            out_reg, out_cls = tracker.net.inference(
+                instance, kernel_reg, kernel_cls)
+    finally:
+        for hook in hooks:
+            hook.remove()
+
+    # cross-correlations with the exemplar kernels are not modules
+    k = kernel_reg.size(-1) ** 2 * kernel_reg.size(1)
+    macs.append((out_reg.numel() + out_cls.numel()) * k)
+    return 2 * sum(macs)
+
+
+def run(tracker, sequences, flops):
+    sizes = []
+    results = [evaluate(tracker, video_path, json_path,
+                        on_frame=lambda t: sizes.append(t.search_sz))
+               for _, video_path, json_path in sequences]
+    return {
+        'gflops': np.mean([flops(sz) for sz in sizes]) / 1e9,
+        'success': np.mean([r['success'] for r in results]),
+        'iou': np.mean([r['iou'] for r in results]),
+        'sizes': sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--profile', default='balanced', choices=list(PROFILES))
+    args = parser.parse_args()
+
+    tracker = TrackerSiamRPN(net_path=args.model)
+    sequences = find_sequences()
+    if not sequences:
+        sys.exit("No train videos with annotations found")
+
+    cache = {}
+
+    def flops(instance_sz):
+        if instance_sz not in cache:
+            cache[instance_sz] = inference_flops(tracker, instance_sz)
+        return cache[instance_sz]
+
+    tracker.set_profile(args.profile)
+    fixed = run(tracker, sequences, flops)
+    tracker.set_profile(args.profile, adaptive_search=True)
+    adaptive = run(tracker, sequences, flops)
+
+    print("| Search | GFLOPs/frame | Success | Mean IoU |")
+    print("|---|---|---|---|")
+    for name, r in (('fixed', fixed), ('adaptive', adaptive)):
+        print(f"| {name} | {r['gflops']:.2f} | {r['success']:.3f} "
+              f"| {r['iou']:.3f} |")
+
+    saved = 1 - adaptive['gflops'] / fixed['gflops']
+    sizes, counts = np.unique(adaptive['sizes'], return_counts=True)
+    print(f"\nFLOPs saved: {saved:.1%}, success change: "
+          f"{adaptive['success'] - fixed['success']:+.3f}")
+    print("Search sizes used: " + ', '.join(
+        f"{sz} ({n / counts.sum():.0%})" for sz, n in zip(sizes, counts)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Exemplar kernel cache on repeated requests for the same clip and box
+
+Replays the website's re-run pattern: the same video and initial box with
+different outputs and end frames, once without and once with a
+KernelCache. Prints the time per request, the cache hit rate and the init
+latency saved, and checks that both runs return the same tracks.
+
+Usage:
+    python benchmarks/kernel_cache.py VIDEO X Y W H [--runs 6] [--frames 30]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+import trackfile
+from kernel_cache import KernelCache
+from siamrpn import TrackerSiamRPN
+
+
+def read_track(path, output):
+    if output == 'vtrk':
+        with open(path, 'rb') as f:
+            return trackfile.binary_to_json(f.read())
+    with open(path) as f:
+        return json.load(f)
+
+
+def replay(tracker, video_path, bbox, requests, kernel_cache=None):
+    tracks, elapsed = [], 0.0
+    for options in requests:
+        t0 = time.perf_counter()
+        path, message, _ = pipeline.process_video(
+            tracker, video_path, *bbox, kernel_cache=kernel_cache, **options)
+        elapsed += time.perf_counter() - t0
+        if path is None:
+            sys.exit(message)
+        tracks.append(read_track(path, options['output']))
+        os.unlink(path)
+    return tracks, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('bbox', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'))
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--runs', type=int, default=6)
+    parser.add_argument('--frames', type=int, default=30,
+                        help='Frames tracked by the longest request')
+    args = parser.parse_args()
+
+    tracker = TrackerSiamRPN(
+        net_path=args.model if os.path.exists(args.model) else None)
+    outputs = ['json', 'vtrk']
+    requests = [{'output': outputs[i % 2],
+                 'end_frame': args.frames - 1 - (i // 2) % 3 * (args.frames // 4)}
+                for i in range(args.runs)]
+
+    plain, plain_time = replay(tracker, args.video, args.bbox, requests)
+    cache = KernelCache()
+    cached, cached_time = replay(
+        tracker, args.video, args.bbox, requests, cache)
+
+    stats = cache.stats()
+    print(f"{len(requests)} requests: {plain_time / len(requests):.3f}s "
+          f"each without cache, {cached_time / len(requests):.3f}s with")
+    print(f"Hit rate {stats['hit_rate']:.0%} ({stats['hits']}/"
+          f"{stats['hits'] + stats['misses']}), init time saved "
+          f"{stats['init_seconds_saved']:.3f}s, {stats['bytes'] / 1e6:.1f} MB cached")
+    print("Tracks identical:", plain == cached)
+
+
+if __name__ == '__main__':
+    main()
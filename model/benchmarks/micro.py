@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+Microbenchmarks for the tracker's hot spots, with regression thresholds
+
+Times each component on CPU and compares it with micro_baseline.json.
+Exits with status 1 when a component is slower than its baseline by more
+than its threshold. --save measures every component over several rounds
+and stores the median round with each component's threshold: the
+default, or twice the spread between rounds when that is larger.
+
+Usage:
+    python benchmarks/micro.py                  # compare with the baseline
+    python benchmarks/micro.py --save           # record a new baseline
+    python benchmarks/micro.py -k crop -k learn # run matching components only
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import torch
+
+from siamrpn import TrackerSiamRPN
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'micro_baseline.json')
+
+FRAME_SIZES = {
+    '720p': (720, 1280),
+    '1080p': (1080, 1920),
+    '4k': (2160, 3840)}
+
+
+def machine_info():
+    return {
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'numpy': np.__version__,
+        'threads': torch.get_num_threads()}
+
+
+def pads(fn):
+    """Whether fn() pads the frame, i.e. calls cv2.copyMakeBorder"""
+    calls = []
+    border = cv2.copyMakeBorder
+
+    def counted(*args, **kargs):
+        calls.append(1)
+        return border(*args, **kargs)
+
+    cv2.copyMakeBorder = counted
+    try:
+        fn()
+    finally:
+        cv2.copyMakeBorder = border
+    return bool(calls)
+
+
+def build_components(tracker):
+    """Map component name to a zero-argument callable"""
+    net = tracker.net.eval()
+    rng = np.random.RandomState(0)
+    components = {}
+
+    exemplar = torch.rand(1, 3, 127, 127) * 255
+
+    def learn():
+        with torch.no_grad():
+            net.learn(exemplar)
+    components['learn'] = learn
+
+    with torch.no_grad():
+        kernel_reg, kernel_cls = net.learn(exemplar)
+    for instance_sz in (271, 287):
+        instance = torch.rand(1, 3, instance_sz, instance_sz) * 255
+
+        def inference(instance=instance):
+            with torch.no_grad():
+                net.inference(instance, kernel_reg, kernel_cls)
+        components[f'inference_{instance_sz}'] = inference
+
+    # 150px target: z_sz = 300 with 0.5 context, x_sz = z_sz * 271 / 127
+    # (~640px), so a centred crop fits inside even a 720p frame
+    x_sz = 300 * 271 / 127
+    for name, (h, w) in FRAME_SIZES.items():
+        frame = rng.randint(0, 256, (h, w, 3), dtype=np.uint8)
+        avg_color = np.mean(frame, axis=(0, 1))
+        for where, center in (('inside', np.array([h / 2, w / 2])),
+                              ('padded', np.array([50.0, 50.0]))):
+            def crop(frame=frame, center=center, avg_color=avg_color):
+                tracker._crop_and_resize(frame, center, x_sz, 271, avg_color)
+            assert pads(crop) == (where == 'padded'), \
+                f"crop_{name}_{where} {'pads' if pads(crop) else 'does not pad'}"
+            components[f'crop_{name}_{where}'] = crop
+
+    response_sz = 19
+    components['create_anchors'] = lambda: tracker._create_anchors(response_sz)
+
+    # tracker state for the penalty and decode paths
+    frame = rng.randint(0, 256, (720, 1280, 3), dtype=np.uint8)
+    tracker.set_profile('balanced')
+    tracker.init(frame, [540, 260, 200, 200])
+    anchor_num = len(tracker.cfg.ratios) * len(tracker.cfg.scales)
+    out_reg = torch.randn(1, 4 * anchor_num, response_sz, response_sz) * 0.1
+    out_cls = torch.randn(1, 2 * anchor_num, response_sz, response_sz)
+    offsets, _ = tracker._decode(out_reg.clone(), out_cls)
+
+    components['create_penalty'] = \
+        lambda: tracker._create_penalty(tracker.target_sz, offsets)
+    # on CPU the decoded offsets share memory with out_reg
+    components['decode'] = lambda: tracker._decode(out_reg.clone(), out_cls)
+
+    return components
+
+
+def measure(fn, repeat=15):
+    """Fastest time per call in milliseconds, after a warm-up call
+
+    The minimum is the run least disturbed by the rest of the machine;
+    medians of a few repeats drifted by 25-35% between runs.
+    """
+    fn()
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    times = timer.repeat(repeat=repeat, number=number)
+    return min(times) / number * 1000
+
+
+def spread(times):
+    return max(times) / min(times) - 1
+
+
+def allowed_slowdown(times, noise, threshold):
+    """
+    Threshold for a component: `threshold`, or twice its spread between
+    rounds if larger. The spread is at least `noise`, the machine-wide
+    median, since a few rounds can understate one component's.
+    """
+    return max(threshold, math.ceil(max(spread(times), noise) * 2 * 20) / 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true',
+                        help='write results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=None,
+                        help='allowed slowdown of every component, e.g. '
+                             '0.25 for 25%% (default: per-component values '
+                             'stored in the baseline)')
+    parser.add_argument('-k', dest='filters', action='append', default=[],
+                        help='only run components containing this string')
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='rounds measured with --save')
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    tracker = TrackerSiamRPN(
+        net_path=args.model if os.path.exists(args.model) else None)
+    tracker.net = tracker.net.cpu()
+    tracker.device = torch.device('cpu')
+
+    components = build_components(tracker)
+    if args.filters:
+        components = {name: fn for name, fn in components.items()
+                      if any(f in name for f in args.filters)}
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    default_threshold = baseline.get('threshold', 0.25)
+    thresholds = baseline.get('thresholds', {})
+
+    if baseline and not args.save:
+        if baseline.get('machine') != machine_info():
+            print("Warning: baseline was recorded on a different setup:")
+            print(f"  {baseline.get('machine')}")
+
+    if args.save:
+        # interleaved rounds, so a slow spell hits every component
+        rounds = {name: [] for name in components}
+        for _ in range(args.rounds):
+            for name, fn in components.items():
+                rounds[name].append(measure(fn, repeat=args.repeat))
+        base_threshold = default_threshold if args.threshold is None \
+            else args.threshold
+        noise = float(np.median([spread(times) for times in rounds.values()]))
+        results, new_thresholds = {}, {}
+        print(f"{'component':<22} {'ms':>10} {'spread':>8} {'threshold':>10}")
+        for name, times in rounds.items():
+            results[name] = round(float(np.median(times)), 4)
+            new_thresholds[name] = allowed_slowdown(
+                times, noise, base_threshold)
+            print(f"{name:<22} {results[name]:10.3f} "
+                  f"{spread(times):8.1%} "
+                  f"{new_thresholds[name]:10.0%}")
+
+        if noise * 2 > base_threshold:
+            print(f"Warning: rounds spread by {noise:.0%} (median), so the "
+                  f"thresholds exceed {base_threshold:.0%} and the check only "
+                  "catches large regressions. Record on an idle machine.")
+
+        if baseline and args.filters:
+            baseline['results'].update(results)
+            results = baseline['results']
+            thresholds.update(new_thresholds)
+            new_thresholds = thresholds
+        with open(args.baseline, 'w') as f:
+            json.dump({'machine': machine_info(),
+                       'threshold': base_threshold,
+                       'thresholds': new_thresholds,
+                       'results': results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    regressions = []
+    print(f"{'component':<22} {'ms':>10} {'baseline':>10} {'change':>8} "
+          f"{'allowed':>8}")
+    for name, fn in components.items():
+        ms = measure(fn, repeat=args.repeat)
+
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"{name:<22} {ms:10.3f}")
+            continue
+        threshold = args.threshold
+        if threshold is None:
+            threshold = thresholds.get(name, default_threshold)
+        change = ms / base - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(f"{name} ({change:+.0%})")
+            flag = '  REGRESSION'
+        print(f"{name:<22} {ms:10.3f} {base:10.3f} {change:+8.1%} "
+              f"{threshold:8.0%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} component(s) regressed beyond their "
+              f"threshold: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
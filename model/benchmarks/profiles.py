@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Measure FPS and success rate of each tracker profile on the train videos
+
+Prints a markdown table of the results. Needs the real model.pth and train
+videos (git lfs pull), not LFS pointer files.
+
+Usage:
+    python benchmarks/profiles.py [--model model.pth] [--profiles fast balanced]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from siamrpn import TrackerSiamRPN, PROFILES
+from train_eval import find_sequences, evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES))
+    args = parser.parse_args()
+
+    tracker = TrackerSiamRPN(net_path=args.model)
+    sequences = find_sequences()
+    if not sequences:
+        sys.exit("No train videos with annotations found")
+
+    print("| Profile | Search | Anchors | FPS | Success | Mean IoU |")
+    print("|---|---|---|---|---|---|")
+    for profile in args.profiles:
+        tracker.set_profile(profile)
+        results = [evaluate(tracker, video_path, json_path)
+                   for _, video_path, json_path in sequences]
+
+        frames = sum(r['frames'] for r in results)
+        seconds = sum(r['frames'] / r['fps'] for r in results if r['fps'])
+        cfg = tracker.base_cfg
+        print(f"| {profile} | {cfg.instance_sz}/{cfg.small_instance_sz} "
+              f"| {len(cfg.ratios) * len(cfg.scales)} "
+              f"| {frames / seconds:.1f} "
+              f"| {np.mean([r['success'] for r in results]):.3f} "
+              f"| {np.mean([r['iou'] for r in results]):.3f} |")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Benchmark the two /track rendering paths
+
+  opencv  track + cv2 drawing + XVID encode, then ffmpeg H.264 re-encode
+  ffmpeg  decode-only tracking pass, then one ffmpeg drawbox/drawtext encode
+
+Usage:
+    python benchmarks/render_pipeline.py VIDEO X Y W H [--scales 1 0.5]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pipeline
+from siamrpn import TrackerSiamRPN
+
+
+def run_opencv(tracker, video_path, bbox, info, output_path):
+    frames = pipeline.iter_frames(video_path, info)
+    return pipeline.render_opencv(
+        pipeline.track_frames(tracker, frames, bbox, info),
+        output_path, info)
+
+
+def run_ffmpeg(tracker, video_path, bbox, info, output_path, scale):
+    t0 = time.perf_counter()
+    boxes = pipeline.track_video(tracker, video_path, bbox, info, scale)
+    t1 = time.perf_counter()
+    pipeline.render_ffmpeg(video_path, boxes, output_path, info)
+    return len(boxes), t1 - t0, time.perf_counter() - t1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video')
+    parser.add_argument('bbox', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'))
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.5])
+    args = parser.parse_args()
+
+    tracker = TrackerSiamRPN(
+        net_path=args.model if os.path.exists(args.model) else None)
+    info = pipeline.probe_video(args.video)
+    if info is None:
+        sys.exit(f"Could not open {args.video}")
+    print(f"{args.video}: {info['width']}x{info['height']} @ "
+          f"{info['fps']:.2f}fps, {info['total_frames']} frames")
+
+    output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
+    try:
+        t0 = time.perf_counter()
+        n = run_opencv(tracker, args.video, args.bbox, info, output_path)
+        base = time.perf_counter() - t0
+        print(f"{'opencv':<14} {base:8.2f}s  {n / base:7.1f} fps")
+
+        missing = pipeline.missing_render_filters()
+        if missing:
+            print(f"ffmpeg renderer skipped: ffmpeg lacks {', '.join(missing)}")
+            return
+
+        for scale in args.scales:
+            n, t_track, t_render = run_ffmpeg(
+                tracker, args.video, args.bbox, info, output_path, scale)
+            total = t_track + t_render
+            print(f"{'ffmpeg@' + format(scale, 'g'):<14} {total:8.2f}s  "
+                  f"{n / total:7.1f} fps  (track {t_track:.2f}s, "
+                  f"render {t_render:.2f}s, {base / total:.2f}x)")
+    finally:
+        os.unlink(output_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+In-process decoding vs a decoder process feeding a shared-memory ring
+
+For each video, prints the throughput of decoding alone and of the
+decode + track loop, with decoder="inline" and decoder="process". Without
+videos, 1080p and 4K H.264 test clips are generated with ffmpeg.
+
+Usage:
+    python benchmarks/shared_decode.py [VIDEO ...] [--frames 300]
+        [--track-frames 100] [--model model.pth] [--slots 8]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import frame_ring
+import pipeline
+from siamrpn import TrackerSiamRPN
+
+TEST_SIZES = {'1080p': (1920, 1080), '4k': (3840, 2160)}
+
+
+def make_clip(path, size, frames):
+    width, height = size
+    subprocess.run(
+        ['ffmpeg', '-v', 'error', '-f', 'lavfi',
+         '-i', f'testsrc2=size={width}x{height}:rate=30',
+         '-frames:v', str(frames), '-c:v', 'libx264', '-preset', 'veryfast',
+         '-pix_fmt', 'yuv420p', '-y', path],
+        check=True)
+
+
+def decode_fps(video_path, info, count, decoder):
+    t0 = time.perf_counter()
+    n = sum(1 for _ in pipeline.iter_frames(
+        video_path, info, count=count, decoder=decoder))
+    return n / (time.perf_counter() - t0)
+
+
+def track_fps(tracker, video_path, info, count, decoder):
+    w, h = info['width'], info['height']
+    bbox = [w // 2 - w // 16, h // 2 - h // 16, w // 8, h // 8]
+    frames = pipeline.iter_frames(video_path, info, count=count, decoder=decoder)
+    t0 = time.perf_counter()
+    n = sum(1 for _ in pipeline.track_frames(tracker, frames, bbox, info))
+    return n / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*')
+    parser.add_argument('--frames', type=int, default=300,
+                        help='Frames decoded per run')
+    parser.add_argument('--track-frames', type=int, default=100,
+                        help='Frames tracked per run, 0 to skip tracking')
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--slots', type=int, default=frame_ring.DEFAULT_SLOTS)
+    args = parser.parse_args()
+    frame_ring.DEFAULT_SLOTS = args.slots
+
+    temp_dir = None
+    videos = args.videos
+    if not videos:
+        temp_dir = tempfile.TemporaryDirectory()
+        videos = []
+        for name, size in TEST_SIZES.items():
+            path = os.path.join(temp_dir.name, f'{name}.mp4')
+            print(f"Generating {name} test clip...")
+            make_clip(path, size, max(args.frames, args.track_frames))
+            videos.append(path)
+
+    tracker = None
+    if args.track_frames:
+        tracker = TrackerSiamRPN(
+            net_path=args.model if os.path.exists(args.model) else None)
+
+    print("| Video | Decode inline | Decode process | Track inline "
+          "| Track process |")
+    print("|---|---|---|---|---|")
+    try:
+        for video_path in videos:
+            info = pipeline.probe_video(video_path)
+            if info is None:
+                sys.exit(f"Could not open {video_path}")
+            row = [f"{os.path.basename(video_path)} "
+                   f"({info['width']}x{info['height']})"]
+            for decoder in pipeline.DECODERS:
+                row.append(f"{decode_fps(video_path, info, args.frames, decoder):.1f} fps")
+            for decoder in pipeline.DECODERS:
+                if tracker is None:
+                    row.append('-')
+                    continue
+                row.append(f"{track_fps(tracker, video_path, info, args.track_frames, decoder):.1f} fps")
+            print('| ' + ' | '.join(row) + ' |')
+    finally:
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Evaluation helpers over the website's bundled train videos
+
+Each website/public/train-videos/<name>.mp4 with a matching
+website/public/train-json/<name>.json is a sequence. The tracker is
+initialised on the first annotated frame (0-indexed) and scored on the
+remaining annotated frames.
+"""
+
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from got10k.utils.metrics import rect_iou
+
+PUBLIC_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    '..', '..', 'website', 'public')
+
+
+def find_sequences(public_dir=PUBLIC_DIR):
+    """List (name, video_path, json_path) for every annotated train video"""
+    video_dir = os.path.join(public_dir, 'train-videos')
+    json_dir = os.path.join(public_dir, 'train-json')
+    sequences = []
+    for filename in sorted(os.listdir(json_dir)):
+        name, ext = os.path.splitext(filename)
+        video_path = os.path.join(video_dir, name + '.mp4')
+        if ext == '.json' and os.path.exists(video_path):
+            sequences.append(
+                (name, video_path, os.path.join(json_dir, filename)))
+    return sequences
+
+
+def load_annotations(json_path):
+    """Map frame index to [x, y, w, h] for visible annotated frames"""
+    with open(json_path) as f:
+        frames = json.load(f)['frames']
+    return {item['frame']: item['bbox'] for item in frames
+            if item.get('visible', True)}
+
+
+def success_rate(ious):
+    """Area under the success curve, as in got10k's OTB experiment"""
+    thresholds = np.linspace(0, 1, 21)
+    return float(np.mean([np.mean(ious > t) for t in thresholds]))
+
+
+def evaluate(tracker, video_path, json_path, on_frame=None):
+    """
+    Track one sequence and score it against its annotations
+
+    Args:
+        tracker: TrackerSiamRPN instance
+        video_path, json_path: Sequence files
+        on_frame: Optional callback called with the tracker before each
+            update, e.g. to record the search size that update will use
+
+    Returns:
+        dict with frames, fps (init + update time only), success and iou
+    """
+    annotations = load_annotations(json_path)
+    first = min(annotations)
+    last = max(annotations)
+
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    pred, gt = [], []
+    elapsed = 0.0
+    frame_id = first
+    while frame_id <= last:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        if frame_id != first and on_frame is not None:
+            on_frame(tracker)
+
+        t0 = time.perf_counter()
+        if frame_id == first:
+            tracker.init(frame, annotations[first])
+        else:
+            box = tracker.update(frame)
+        elapsed += time.perf_counter() - t0
+
+        if frame_id != first and frame_id in annotations:
+            pred.append(box)
+            gt.append(annotations[frame_id])
+        frame_id += 1
+    cap.release()
+
+    ious = rect_iou(np.array(pred, dtype=float), np.array(gt, dtype=float)) \
+        if pred else np.zeros(0)
+    frames = frame_id - first
+    return {
+        'frames': frames,
+        'fps': frames / elapsed if elapsed > 0 else 0.0,
+        'success': success_rate(ious) if len(ious) else 0.0,
+        'iou': float(np.mean(ious)) if len(ious) else 0.0}
@@ -6,17 +6,19 @@ Run this in Google Colab to expose tracking API
 
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-import cv2
 import torch
 import numpy as np
 import tempfile
 import os
-import base64
+import urllib.error
+import urllib.parse
+import urllib.request
 from pathlib import Path
 from siamrpn import TrackerSiamRPN
+from kernel_cache import KernelCache
+import pipeline
 from werkzeug.utils import secure_filename
 import json
-import subprocess
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Next.js frontend
@@ -24,9 +26,38 @@ CORS(app)  # Enable CORS for Next.js frontend
 # Model path
 MODEL_PATH = "model.pth"
 
+# Tracking checkpoints, so a retried job resumes where it stopped (unset disables)
+CHECKPOINT_DIR = os.environ.get("CHECKPOINT_DIR")
+
+# Initialised tracker states reused across requests for the same video and box
+KERNEL_CACHE_BYTES = 256 * 1024 * 1024
+kernel_cache = KernelCache(KERNEL_CACHE_BYTES)
+
 # Global tracker instance
 tracker = None
 
+# Largest video /track-url will download, read in chunks
+MAX_DOWNLOAD_BYTES = 500 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
+
+# Optional tracking settings accepted by /track and /track-url
+TRACKING_OPTIONS = {
+    'render': str,
+    'decode_scale': float,
+    'profile': str,
+    'start_frame': int,
+    'end_frame': int,
+    'start_time': float,
+    'end_time': float,
+    'output': str,
+    'adaptive': lambda v: str(v).lower() in ('1', 'true', 'yes'),
+    'decoder': str,
+}
+
+
+class DownloadTooLarge(Exception):
+    """Raised when a downloaded video exceeds MAX_DOWNLOAD_BYTES"""
+
 def load_tracker():
     """Load the SiamRPN tracker with the pretrained model"""
     global tracker
@@ -38,126 +69,92 @@ def load_tracker():
     return tracker
 
 
-def process_video_tracking(video_path, bbox_x, bbox_y, bbox_w, bbox_h):
+def process_video_tracking(video_path, bbox_x, bbox_y, bbox_w, bbox_h, **options):
     """
     Process video with object tracking
     
+    Uses the same engine as the FastAPI server (pipeline.process_video).
+    
     Args:
         video_path: Path to input video
         bbox_x, bbox_y, bbox_w, bbox_h: Bounding box coordinates
+        **options: See TRACKING_OPTIONS
         
     Returns:
-        Path to output video with tracking results
+        tuple: (output_path, message, metadata)
     """
     try:
         tracker = load_tracker()
+    except Exception as e:
+        return None, f"Error: {str(e)}", None
+    
+    return pipeline.process_video(
+        tracker, video_path, bbox_x, bbox_y, bbox_w, bbox_h,
+        checkpoint_dir=CHECKPOINT_DIR, kernel_cache=kernel_cache, **options)
+
+
+def tracking_options(values):
+    """Read the optional tracking settings from form fields or JSON"""
+    return {key: cast(values[key]) for key, cast in TRACKING_OPTIONS.items()
+            if values.get(key) not in (None, '')}
+
+
+def download_video(url, path, max_bytes=MAX_DOWNLOAD_BYTES):
+    """
+    Download a video in chunks without holding it in memory
+    
+    Args:
+        url: http(s) URL of the video
+        path: Destination file
+        max_bytes: Size limit
         
-        cap = cv2.VideoCapture(video_path)
-        
-        if not cap.isOpened():
-            return None, "Error: Could not open video file"
-        
-        # Get video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        ret, frame = cap.read()
-        if not ret:
-            return None, "Error: Could not read first frame"
-        
-        # Validate bounding box
-        if bbox_w <= 0 or bbox_h <= 0:
-            return None, "Error: Invalid bounding box dimensions"
-        
-        if bbox_x < 0 or bbox_y < 0 or bbox_x + bbox_w > width or bbox_y + bbox_h > height:
-            return None, f"Error: Bounding box out of bounds. Frame size: {width}x{height}"
-        
-        bbox = (bbox_x, bbox_y, bbox_w, bbox_h)
-        
-        # Initialize tracker
-        tracker.init(frame, bbox)
-        
-        # Create temporary output file
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
-        
-        # Use XVID codec which is widely supported
-        fourcc = cv2.VideoWriter_fourcc(*'XVID')
-        writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            
-        if not writer.isOpened():
-            return None, "Error: Could not create video writer"
-        
-        # Draw first frame with initial bbox
-        x, y, w, h = [int(v) for v in bbox]
-        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-        cv2.putText(frame, 'Frame: 1', (10, 30), 
-                    cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        writer.write(frame)
-        
-        # Process remaining frames
-        frame_count = 1
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_count += 1
-            
-            # Update tracker
-            bbox = tracker.update(frame)
-            
-            # Draw tracking result
-            x, y, w, h = [int(v) for v in bbox]
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-            cv2.putText(frame, f'Frame: {frame_count}', (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            writer.write(frame)
-            
-            # Print progress every 30 frames
-            if frame_count % 30 == 0:
-                print(f"Processed {frame_count}/{total_frames} frames")
-        
-        # Cleanup
-        cap.release()
-        writer.release()
-        
-        # Re-encode with ffmpeg for better browser compatibility
-        print("Re-encoding video for browser compatibility...")
-        final_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4').name
-        
-        try:
-            # Use ffmpeg to re-encode with H.264 and AAC (browser-friendly)
-            subprocess.run([
-                'ffmpeg', '-i', output_path,
-                '-c:v', 'libx264',  # H.264 video codec
-                '-preset', 'fast',   # Fast encoding
-                '-crf', '23',        # Quality (lower = better, 23 is good)
-                '-pix_fmt', 'yuv420p',  # Pixel format for compatibility
-                '-movflags', '+faststart',  # Enable streaming
-                '-y',  # Overwrite output file
-                final_output
-            ], check=True, capture_output=True, text=True)
-            
-            # Remove temporary file
-            os.unlink(output_path)
-            output_path = final_output
-            print("✓ Video re-encoded successfully")
-        except subprocess.CalledProcessError as e:
-            print(f"Warning: ffmpeg re-encoding failed: {e.stderr}")
-            print("Using original video")
-            # Keep using the original output_path
-        except FileNotFoundError:
-            print("Warning: ffmpeg not found, using original video")
-            # Keep using the original output_path
-        
-        return output_path, f"Successfully tracked {frame_count} frames"
+    Returns:
+        int: Number of bytes written
         
-    except Exception as e:
-        return None, f"Error: {str(e)}"
+    Raises:
+        ValueError: If the URL is not http(s)
+        DownloadTooLarge: If the video is larger than max_bytes
+    """
+    if urllib.parse.urlparse(url).scheme not in ('http', 'https'):
+        raise ValueError("video_url must be an http(s) URL")
+    
+    with urllib.request.urlopen(url, timeout=30) as response:
+        length = response.headers.get('Content-Length')
+        if length is not None and int(length) > max_bytes:
+            raise DownloadTooLarge(f"Video is larger than {max_bytes} bytes")
+        
+        size = 0
+        with open(path, 'wb') as f:
+            while True:
+                chunk = response.read(DOWNLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise DownloadTooLarge(f"Video is larger than {max_bytes} bytes")
+                f.write(chunk)
+    
+    return size
+
+
+def send_output(output_path, metadata):
+    """Stream a result file from disk; the file is unlinked up front"""
+    mimetype, filename = pipeline.OUTPUT_FORMATS[metadata['output']]
+    output_file = open(output_path, 'rb')
+    os.unlink(output_path)
+    response = send_file(
+        output_file,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=filename
+    )
+    response.headers['X-Frames-Processed'] = str(metadata['frames_processed'])
+    response.headers['X-Start-Frame'] = str(metadata['start_frame'])
+    response.headers['X-Resolution'] = metadata['resolution']
+    response.headers['X-FPS'] = str(metadata['fps'])
+    response.headers['X-Render'] = metadata['render']
+    response.headers['X-Kernel-Cache'] = metadata['kernel_cache']
+    return response
 
 
 @app.route('/health', methods=['GET'])
@@ -166,7 +163,8 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'gpu_available': torch.cuda.is_available(),
-        'gpu_name': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None
+        'gpu_name': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+        'kernel_cache': kernel_cache.stats()
     })
 
 
@@ -177,6 +175,7 @@ def track_video():
     Expects multipart/form-data with:
     - video: video file
     - bbox_x, bbox_y, bbox_w, bbox_h: bounding box coordinates
+    - optional settings from TRACKING_OPTIONS
     """
     try:
         # Check if video file is present
@@ -197,6 +196,11 @@ def track_video():
         except (ValueError, TypeError):
             return jsonify({'error': 'Invalid bounding box coordinates'}), 400
         
+        try:
+            options = tracking_options(request.form)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid tracking options'}), 400
+        
         # Save uploaded video temporarily
         temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
         video_file.save(temp_input.name)
@@ -206,8 +210,8 @@ def track_video():
         print(f"Bounding box: ({bbox_x}, {bbox_y}, {bbox_w}, {bbox_h})")
         
         # Process video
-        output_path, message = process_video_tracking(
-            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h
+        output_path, message, metadata = process_video_tracking(
+            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h, **options
         )
         
         # Clean up input file
@@ -216,13 +220,8 @@ def track_video():
         if output_path is None:
             return jsonify({'error': message}), 400
         
-        # Return the processed video
-        return send_file(
-            output_path,
-            mimetype='video/mp4',
-            as_attachment=True,
-            download_name='tracked_video.mp4'
-        )
+        # Return the processed video or track data
+        return send_output(output_path, metadata)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -231,51 +230,59 @@ def track_video():
 @app.route('/track-url', methods=['POST'])
 def track_video_url():
     """
-    Alternative endpoint that accepts video URL and returns processed video URL
-    Useful for larger files or async processing
+    Alternative endpoint that accepts a video URL
+    Expects JSON with:
+    - video_url: http(s) URL of the video (at most MAX_DOWNLOAD_BYTES)
+    - bbox: {x, y, w, h}
+    - optional settings from TRACKING_OPTIONS
+    Streams back the processed video, or the track data with
+    output=json|vtrk, like /track.
     """
+    temp_input = None
     try:
         data = request.get_json()
         
         video_url = data.get('video_url')
         bbox = data.get('bbox', {})
         
-        bbox_x = int(bbox.get('x', 0))
-        bbox_y = int(bbox.get('y', 0))
-        bbox_w = int(bbox.get('w', 0))
-        bbox_h = int(bbox.get('h', 0))
+        try:
+            bbox_x = int(bbox.get('x', 0))
+            bbox_y = int(bbox.get('y', 0))
+            bbox_w = int(bbox.get('w', 0))
+            bbox_h = int(bbox.get('h', 0))
+            options = tracking_options(data)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid bounding box or tracking options'}), 400
         
         # Download video from URL
-        import urllib.request
         temp_input = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-        urllib.request.urlretrieve(video_url, temp_input.name)
         temp_input.close()
+        try:
+            size = download_video(video_url, temp_input.name, MAX_DOWNLOAD_BYTES)
+        except DownloadTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except urllib.error.URLError as e:
+            return jsonify({'error': f"Could not download video: {e.reason}"}), 400
+        print(f"Downloaded {size / (1024 * 1024):.1f} MB from {video_url}")
         
         # Process video
-        output_path, message = process_video_tracking(
-            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h
+        output_path, message, metadata = process_video_tracking(
+            temp_input.name, bbox_x, bbox_y, bbox_w, bbox_h, **options
         )
         
-        os.unlink(temp_input.name)
-        
         if output_path is None:
             return jsonify({'error': message}), 400
         
-        # Read output video and encode as base64 (for smaller videos)
-        # Or upload to cloud storage and return URL
-        with open(output_path, 'rb') as f:
-            video_data = base64.b64encode(f.read()).decode('utf-8')
-        
-        os.unlink(output_path)
-        
-        return jsonify({
-            'success': True,
-            'message': message,
-            'video_base64': video_data
-        })
+        return send_output(output_path, metadata)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    finally:
+        if temp_input and os.path.exists(temp_input.name):
+            os.unlink(temp_input.name)
 
 
 if __name__ == '__main__':
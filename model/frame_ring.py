@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+"""
+Shared-memory frame ring between a decoder process and the tracker
+
+The decoder runs in its own process, so video decoding no longer competes
+with the tracker for the GIL. It writes frames straight into a ring of
+preallocated slots in shared memory: cv2.VideoCapture.read() decodes into
+the slot, and raw ffmpeg output is read into it. The tracking process sees
+each slot as a NumPy view, without copying or unpickling.
+
+Flow control runs over the decoder's stdin and stdout, one byte per frame:
+
+    tracker                                  decoder
+      write one credit per slot  ---------->
+                                             read a credit (blocks when
+                                               the ring is full)
+                                             decode into slots[i % n]
+      read a byte  <------------------------ write a byte
+      use slots[i % n]
+      write a credit  --------------------->
+
+The decoder never runs more than one ring ahead of the tracker, which is
+the backpressure. It ends the stream by exiting: status 0 at the end of
+the video, otherwise an error message on stderr.
+
+The decoder is started as `python frame_ring.py`, not through
+multiprocessing. That way it imports only OpenCV and NumPy, not the
+tracking process's main module, and starts in a fraction of a second.
+It also never inherits CUDA or OpenMP state from a fork.
+
+The ring lives in /dev/shm, and a 4K ring of 8 slots takes about 200 MB.
+Docker gives containers 64 MB there by default, and touching shared
+memory past that kills the process with SIGBUS. The ring is therefore
+shrunk to what fits in half of the free space, with its pages reserved
+up front. When not even MIN_SLOTS slots fit, RingUnavailable is raised
+before any frame is decoded, and the caller decodes inline instead.
+Containers get more room with `docker run --shm-size=512m`.
+"""
+
+import errno
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from multiprocessing import resource_tracker, shared_memory
+
+import cv2
+import numpy as np
+
+# Frames the decoder may run ahead of the tracker
+DEFAULT_SLOTS = 8
+
+# Fewest slots worth a decoder process: one being tracked, one decoding
+MIN_SLOTS = 2
+
+# Where POSIX shared memory lives, and the share of its free space a
+# ring may take, leaving room for concurrent jobs
+SHM_PATH = '/dev/shm'
+SHM_SHARE = 0.5
+
+
+class RingUnavailable(OSError):
+    """Raised when shared memory is too small for a frame ring"""
+
+
+def shm_free_bytes():
+    """Free bytes in SHM_PATH, or None where it cannot be checked"""
+    try:
+        stat = os.statvfs(SHM_PATH)
+    except (OSError, AttributeError):
+        return None
+    return stat.f_bavail * stat.f_frsize
+
+
+def ring_slots(frame_bytes, slots=None):
+    """
+    Number of slots, at most `slots` (default DEFAULT_SLOTS), whose
+    frames fit in SHM_SHARE of the free shared memory; 0 when fewer than
+    MIN_SLOTS fit
+    """
+    slots = DEFAULT_SLOTS if slots is None else slots
+    free = shm_free_bytes()
+    if free is not None:
+        slots = min(slots, int(free * SHM_SHARE) // frame_bytes)
+    return slots if slots >= MIN_SLOTS else 0
+
+
+def _reserve(shm, size):
+    # allocate the pages now, so a full /dev/shm fails here with ENOSPC
+    # instead of SIGBUS on first write
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(shm._fd, 0, size)
+        except OSError as e:
+            # EINVAL, EOPNOTSUPP: no fallocate on this filesystem
+            if e.errno in (errno.ENOSPC, errno.ENOMEM, errno.EFBIG):
+                raise
+
+
+def _read_into(stream, buffer):
+    view = memoryview(buffer).cast('B')
+    filled = 0
+    while filled < len(view):
+        n = stream.readinto(view[filled:])
+        if not n:
+            return False
+        filled += n
+    return True
+
+
+def _decode_cv2(video_path, start, count, size):
+    """Yield functions that decode the next frame into a slot"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open {video_path}")
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    def read(slot):
+        if size is not None:
+            ret, frame = cap.read()
+            if ret:
+                cv2.resize(frame, tuple(size), dst=slot,
+                           interpolation=cv2.INTER_AREA)
+            return ret
+        ret, frame = cap.read(slot)
+        if ret and frame is not slot:
+            # decoded size differs from the probed one
+            np.copyto(slot, frame)
+        return ret
+
+    try:
+        i = 0
+        while count is None or i < count:
+            yield read
+            i += 1
+    finally:
+        cap.release()
+
+
+def _decode_ffmpeg(cmd):
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            yield lambda slot: _read_into(proc.stdout, slot)
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def _decoder(shm_name, spec):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # the tracking process owns the segment; keep this process's resource
+    # tracker from unlinking it at exit
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    slots = spec['slots']
+    frames = np.ndarray((slots,) + tuple(spec['shape']), dtype=np.uint8,
+                        buffer=shm.buf)
+    credits = sys.stdin.buffer
+    ready = sys.stdout.buffer
+
+    source = spec['source']
+    if source[0] == 'ffmpeg':
+        readers = _decode_ffmpeg(*source[1:])
+    else:
+        readers = _decode_cv2(*source[1:])
+    try:
+        for i, read in enumerate(readers):
+            if not credits.read(1):
+                break
+            if not read(frames[i % slots]):
+                break
+            ready.write(b'\x01')
+            ready.flush()
+    finally:
+        readers.close()
+        del frames
+        shm.close()
+
+
+def iter_shared_frames(source, shape, slots=None):
+    """
+    Decode frames in a separate process through a shared-memory ring
+
+    A yielded frame is a view of its slot, so it is only valid until the
+    next frame is requested. It is writable, so overlays can be drawn on
+    it in place. Copy it to keep it.
+
+    Args:
+        source: ['cv2', video_path, start, count, size] decodes with
+            OpenCV, seeking to frame `start` and resizing to `size`
+            (width, height) unless it is None. ['ffmpeg', cmd] reads raw
+            BGR frames from the stdout of an ffmpeg command.
+        shape: Frame shape (height, width, 3)
+        slots: Maximum number of frame slots in the ring (default
+            DEFAULT_SLOTS), reduced to what fits in shared memory
+
+    Yields:
+        BGR frames as numpy views into shared memory
+
+    Raises:
+        RingUnavailable: Before the first frame, if shared memory cannot
+            hold MIN_SLOTS frames
+        RuntimeError: If the decoder fails
+    """
+    shape = tuple(shape)
+    frame_bytes = int(np.prod(shape))
+    slots = ring_slots(frame_bytes, slots)
+    if not slots:
+        raise RingUnavailable(
+            f"{SHM_PATH} has no room for {MIN_SLOTS} frames of "
+            f"{frame_bytes / 1e6:.1f} MB")
+    shm = shared_memory.SharedMemory(create=True, size=slots * frame_bytes)
+    try:
+        _reserve(shm, slots * frame_bytes)
+    except OSError as e:
+        shm.close()
+        shm.unlink()
+        raise RingUnavailable(
+            f"Could not reserve {slots * frame_bytes / 1e6:.0f} MB in "
+            f"{SHM_PATH}: {e.strerror}") from e
+    frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=shm.buf)
+    spec = json.dumps({'slots': slots, 'shape': shape, 'source': source})
+    # a file, so decoder warnings can never fill a pipe and stall it
+    errors = tempfile.TemporaryFile()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), shm.name, spec],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=errors)
+    try:
+        proc.stdin.write(b'\x01' * slots)
+        proc.stdin.flush()
+        i = 0
+        while proc.stdout.read(1):
+            yield frames[i % slots]
+            i += 1
+            try:
+                proc.stdin.write(b'\x01')
+                proc.stdin.flush()
+            except BrokenPipeError:
+                pass
+
+        if proc.wait() != 0:
+            errors.seek(0)
+            error = errors.read().decode(errors='replace').strip()
+            raise RuntimeError(
+                f"Decoder failed: {error.splitlines()[-1] if error else proc.returncode}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        for stream in (proc.stdin, proc.stdout, errors):
+            try:
+                stream.close()
+            except BrokenPipeError:
+                pass
+        del frames
+        try:
+            shm.close()
+        except BufferError:
+            # the caller still holds a frame; the mapping goes with it
+            pass
+        shm.unlink()
+
+
+if __name__ == '__main__':
+    _decoder(sys.argv[1], json.loads(sys.argv[2]))
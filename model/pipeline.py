@@ -0,0 +1,850 @@
+#!/usr/bin/env python
+"""
+Tracking pipeline for VisioTrack
+Frame decoding, the tracking pass, checkpoints and the two overlay renderers
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import cv2
+import numpy as np
+import torch
+
+import frame_ring
+import trackfile
+from siamrpn import PROFILES
+
+logger = logging.getLogger(__name__)
+
+# Overlay style shared by the OpenCV and ffmpeg renderers
+BOX_COLOR = (0, 255, 0)
+BOX_THICKNESS = 3
+FONT_SIZE = 28
+
+# Overlay rendering backends
+RENDER_MODES = ('opencv', 'ffmpeg')
+
+# ffmpeg filters the ffmpeg renderer relies on
+RENDER_FILTERS = ('sendcmd', 'drawbox', 'drawtext')
+
+# Where frames are decoded: in the tracking process, or in a decoder
+# process feeding a shared-memory ring (see frame_ring.py)
+DECODERS = ('inline', 'process')
+
+# Outputs: media type and download name
+OUTPUT_FORMATS = {
+    'video': ('video/mp4', 'tracked_video.mp4'),
+    'json': ('application/json', 'track.json'),
+    'vtrk': ('application/octet-stream', 'track.vtrk'),
+}
+
+# Frames tracked between checkpoints of a resumable tracking pass
+CHECKPOINT_EVERY = 300
+
+# Checkpoints not updated for this many seconds belong to jobs that were
+# never retried and are deleted
+CHECKPOINT_MAX_AGE = 24 * 3600
+
+# Files making up a checkpoint, after its path prefix
+CHECKPOINT_SUFFIXES = ('.pt', '.pt.tmp', '.jsonl')
+
+# H.264 settings for browser playback
+H264_ARGS = [
+    '-c:v', 'libx264',
+    '-preset', 'fast',
+    '-crf', '23',
+    '-pix_fmt', 'yuv420p',
+    '-movflags', '+faststart',
+]
+
+
+def probe_video(video_path):
+    """
+    Read basic video properties
+
+    Args:
+        video_path: Path to input video
+
+    Returns:
+        dict with fps, width, height and total_frames, or None if the
+        video cannot be opened
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    info = {
+        'fps': fps if fps > 0 else 30.0,
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'total_frames': int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+    }
+    cap.release()
+    return info
+
+
+def frame_range(info, start_frame=None, end_frame=None,
+                start_time=None, end_time=None):
+    """
+    Resolve a requested segment to frame indices
+
+    Bounds may be given as 0-indexed frames or as timestamps in seconds;
+    a frame bound takes precedence over a timestamp for the same end. The
+    end frame is included in the segment.
+
+    Args:
+        info: Video properties from probe_video
+
+    Returns:
+        tuple: (start, count) where count is None when the segment runs to
+        the end of the video
+
+    Raises:
+        ValueError: If the range is empty or outside the video
+    """
+    if start_frame is None and start_time is not None:
+        start_frame = int(round(start_time * info['fps']))
+    if end_frame is None and end_time is not None:
+        end_frame = int(round(end_time * info['fps']))
+
+    start = start_frame or 0
+    if start < 0:
+        raise ValueError("Start of range must not be negative")
+    if info['total_frames'] > 0 and start >= info['total_frames']:
+        raise ValueError(
+            f"Start of range is past the last frame ({info['total_frames'] - 1})")
+    if end_frame is None:
+        return start, None
+
+    if end_frame < start:
+        raise ValueError("End of range is before its start")
+    if info['total_frames'] > 0:
+        end_frame = min(end_frame, info['total_frames'] - 1)
+    return start, end_frame - start + 1
+
+
+def scaled_size(info, scale):
+    """Frame size (width, height) after decoding at the given scale"""
+    return (max(1, int(round(info['width'] * scale))),
+            max(1, int(round(info['height'] * scale))))
+
+
+def iter_frames(video_path, info, scale=1.0, start=0, count=None,
+                decoder='inline'):
+    """
+    Decode frames, optionally at reduced resolution
+
+    With scale < 1 the frames are downscaled inside ffmpeg and piped as raw
+    BGR, so full-resolution frames never reach Python. Without ffmpeg the
+    frames are decoded by OpenCV and resized afterwards. Either way the
+    decoder seeks to the start frame and stops after count frames.
+
+    Args:
+        video_path: Path to input video
+        info: Video properties from probe_video
+        scale: Resolution factor (0 < scale <= 1)
+        start: Index of the first frame
+        count: Number of frames to decode, None for all remaining
+        decoder: "inline" decodes in this process; "process" decodes in a
+            separate process into shared memory, and each frame is only
+            valid until the next one is requested. Falls back to inline
+            when shared memory is too small (see frame_ring.py)
+
+    Yields:
+        BGR frames as numpy arrays
+    """
+    size = scaled_size(info, scale)
+    use_ffmpeg = scale < 1 and shutil.which('ffmpeg')
+
+    if decoder == 'process':
+        if use_ffmpeg:
+            source = ('ffmpeg', ffmpeg_decode_cmd(
+                video_path, size, info['fps'], start, count))
+        else:
+            source = ('cv2', video_path, start, count,
+                      size if scale < 1 else None)
+        try:
+            yield from frame_ring.iter_shared_frames(
+                source, (size[1], size[0], 3))
+            return
+        except frame_ring.RingUnavailable as e:
+            # raised before the first frame, so nothing was yielded yet
+            logger.warning(f"{e}; decoding in this process instead")
+
+    if use_ffmpeg:
+        yield from _iter_frames_ffmpeg(
+            video_path, size, info['fps'], start, count)
+        return
+
+    cap = cv2.VideoCapture(video_path)
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    try:
+        read = 0
+        while count is None or read < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if scale < 1:
+                frame = cv2.resize(frame, scaled_size(info, scale),
+                                   interpolation=cv2.INTER_AREA)
+            read += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def seek_args(start, fps):
+    """ffmpeg input options that seek to a frame index"""
+    if start <= 0:
+        return []
+    # half a frame early so rounding cannot skip the start frame
+    return ['-ss', f'{(start - 0.5) / fps:.6f}']
+
+
+def ffmpeg_decode_cmd(video_path, size, fps, start=0, count=None):
+    """ffmpeg command writing frames scaled to size as raw BGR to stdout"""
+    width, height = size
+    limit = ['-frames:v', str(count)] if count is not None else []
+    return (['ffmpeg', '-v', 'error'] + seek_args(start, fps) +
+            ['-i', video_path,
+             '-vf', f'scale={width}:{height}:flags=area'] + limit +
+            ['-f', 'rawvideo',
+             '-pix_fmt', 'bgr24',
+             '-'])
+
+
+def _iter_frames_ffmpeg(video_path, size, fps, start=0, count=None):
+    width, height = size
+    frame_bytes = width * height * 3
+    proc = subprocess.Popen(
+        ffmpeg_decode_cmd(video_path, size, fps, start, count),
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = proc.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            yield np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+    finally:
+        proc.stdout.close()
+        proc.kill()
+        proc.wait()
+
+
+def clip_box(box, width, height):
+    """Clip an [x, y, w, h] box to the frame and round to integers"""
+    x, y, w, h = [int(v) for v in box]
+    x = max(0, min(x, width - 1))
+    y = max(0, min(y, height - 1))
+    w = max(1, min(w, width - x))
+    h = max(1, min(h, height - y))
+    return [x, y, w, h]
+
+
+def track_frames(tracker, frames, bbox, info, scale=1.0, resume=False,
+                 kernel_cache=None, cache_key=None, init_info=None):
+    """
+    Run the tracker over a stream of frames
+
+    The tracker sees the frames at whatever resolution they were decoded
+    at; boxes are mapped back to full-resolution pixels.
+
+    Args:
+        tracker: TrackerSiamRPN instance
+        frames: Iterable of BGR frames
+        bbox: Initial [x, y, w, h] box in full-resolution pixels
+        info: Video properties from probe_video
+        scale: Resolution factor the frames were decoded at
+        resume: The tracker was restored with set_state and is already on
+            the frame before the first one; skip init
+        kernel_cache: Optional KernelCache to initialise through, with
+            cache_key identifying the first frame (see kernel_cache.py)
+        init_info: Optional dict whose 'init' is set to how the tracker
+            started: 'hit' or 'miss' in kernel_cache, 'fresh' without a
+            cache, or 'resumed'
+
+    Yields:
+        tuple: (frame, box) with box clipped to the full-resolution frame
+    """
+    width, height = info['width'], info['height']
+    sw, sh = scaled_size(info, scale)
+    sx, sy = sw / width, sh / height
+
+    if init_info is not None and resume:
+        init_info['init'] = 'resumed'
+
+    for i, frame in enumerate(frames):
+        if i == 0 and not resume:
+            init_box = [bbox[0] * sx, bbox[1] * sy, bbox[2] * sx, bbox[3] * sy]
+            if kernel_cache is not None:
+                how = kernel_cache.init(tracker, frame, init_box, cache_key)
+            else:
+                tracker.init(frame, init_box)
+                how = 'fresh'
+            if init_info is not None:
+                init_info['init'] = how
+            box = bbox
+        else:
+            box = tracker.update(frame)
+            box = [box[0] / sx, box[1] / sy, box[2] / sx, box[3] / sy]
+        yield frame, clip_box(box, width, height)
+
+        if (i + 1) % 30 == 0:
+            logger.info(f"Processed {i + 1}/{info['total_frames']} frames")
+
+
+def track_records(tracker, video_path, bbox, info, scale=1.0, start=0,
+                  count=None, checkpoint=None, checkpoint_every=CHECKPOINT_EVERY,
+                  decoder='inline', kernel_cache=None, cache_key=None,
+                  init_info=None):
+    """
+    Decode-only tracking pass
+
+    Args:
+        tracker: TrackerSiamRPN instance
+        video_path: Path to input video
+        bbox: Initial [x, y, w, h] box in full-resolution pixels, on the
+            start frame
+        info: Video properties from probe_video
+        scale: Resolution factor used for decoding
+        start, count: Segment to track, see frame_range
+        checkpoint: Optional checkpoint path prefix. The pass resumes from
+            an existing checkpoint and saves one every checkpoint_every
+            frames; the caller removes it once the output is written
+        checkpoint_every: Frames between checkpoints
+        decoder: "inline" or "process", see iter_frames
+        kernel_cache, cache_key, init_info: Cached init, see track_frames
+
+    Returns:
+        list: One {'frame', 'bbox', 'visible', 'score'} record per frame, in
+        the track JSON schema with boxes in full-resolution pixels
+    """
+    records = load_checkpoint(tracker, checkpoint) if checkpoint else []
+    saved = len(records)
+    if saved:
+        logger.info(f"Resuming from checkpoint at frame {start + saved}")
+    remaining = None if count is None else count - saved
+
+    frames = iter_frames(video_path, info, scale, start + saved, remaining,
+                         decoder)
+    tracked = track_frames(tracker, frames, bbox, info, scale, saved > 0,
+                           kernel_cache, cache_key, init_info)
+    for _, box in tracked:
+        records.append({'frame': start + len(records), 'bbox': box,
+                        'visible': True, 'score': round(tracker.score, 4)})
+        if checkpoint and len(records) % checkpoint_every == 0:
+            save_checkpoint(tracker, checkpoint, records, saved)
+            saved = len(records)
+    return records
+
+
+def track_video(tracker, video_path, bbox, info, scale=1.0, start=0,
+                count=None, checkpoint=None, checkpoint_every=CHECKPOINT_EVERY,
+                decoder='inline', kernel_cache=None, cache_key=None,
+                init_info=None):
+    """
+    Decode-only tracking pass returning only the boxes
+
+    Returns:
+        list: One [x, y, w, h] box per frame in full-resolution pixels
+    """
+    records = track_records(
+        tracker, video_path, bbox, info, scale, start, count,
+        checkpoint, checkpoint_every, decoder, kernel_cache, cache_key,
+        init_info)
+    return [record['bbox'] for record in records]
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 hex digest of a file's contents"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_key(video_hash, **params):
+    """
+    Name of a tracking job's checkpoint
+
+    Jobs match when the video content (file_hash) and every parameter that
+    affects the tracking pass are the same, so a retried upload resumes
+    even though it arrives under a new temporary name.
+    """
+    digest = hashlib.sha1(video_hash.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def save_checkpoint(tracker, checkpoint, records, saved=0):
+    """
+    Checkpoint a tracking pass
+
+    New records are appended to <checkpoint>.jsonl, then the tracker state
+    and the record count are atomically replaced in <checkpoint>.pt, so a
+    crash at any point leaves a consistent checkpoint behind.
+
+    Args:
+        tracker: TrackerSiamRPN after the last record's frame
+        checkpoint: Checkpoint path prefix
+        records: All records so far
+        saved: Number of records already in the partial output
+    """
+    with open(checkpoint + '.jsonl', 'a') as f:
+        for record in records[saved:]:
+            f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+    # only tensors and plain values, so it loads with weights_only=True.
+    # NumPy arrays and scalars become tensors and are restored with their
+    # dtype: a float64 scalar such as z_sz keeps products with float32
+    # arrays in float64, a Python float would not
+    state = tracker.get_state()
+    arrays = [key for key, value in state.items()
+              if isinstance(value, (np.ndarray, np.generic))]
+    state = {key: torch.from_numpy(np.asarray(value)) if key in arrays
+             else _plain(value) for key, value in state.items()}
+
+    temp_path = checkpoint + '.pt.tmp'
+    torch.save({'frames': len(records), 'tracker': state, 'arrays': arrays},
+               temp_path)
+    os.replace(temp_path, checkpoint + '.pt')
+
+
+def _plain(value):
+    """NumPy scalars inside lists and dicts, e.g. motion, as Python numbers"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+def load_checkpoint(tracker, checkpoint):
+    """
+    Restore the tracker from a checkpoint, if there is one
+
+    Returns:
+        list: The records tracked before the checkpoint, empty when there
+        is no usable checkpoint
+    """
+    if not os.path.exists(checkpoint + '.pt'):
+        remove_checkpoint(checkpoint)
+        return []
+
+    state = torch.load(checkpoint + '.pt', weights_only=True)
+    records = []
+    if os.path.exists(checkpoint + '.jsonl'):
+        with open(checkpoint + '.jsonl') as f:
+            for line in f:
+                if len(records) == state['frames']:
+                    break
+                records.append(json.loads(line))
+    if len(records) < state['frames']:
+        logger.warning("Checkpoint is missing records, starting over")
+        remove_checkpoint(checkpoint)
+        return []
+
+    # drop records appended after the last complete checkpoint
+    with open(checkpoint + '.jsonl', 'w') as f:
+        f.writelines(json.dumps(record) + '\n' for record in records)
+    tracker_state = state['tracker']
+    for key in state['arrays']:
+        # [()] turns 0-d arrays back into scalars, keeps other arrays
+        tracker_state[key] = tracker_state[key].numpy()[()]
+    tracker.set_state(tracker_state)
+    return records
+
+
+def remove_checkpoint(checkpoint):
+    """Delete a checkpoint's files"""
+    for suffix in CHECKPOINT_SUFFIXES:
+        if os.path.exists(checkpoint + suffix):
+            os.unlink(checkpoint + suffix)
+
+
+def prune_checkpoints(checkpoint_dir, max_age=CHECKPOINT_MAX_AGE):
+    """
+    Delete checkpoints whose files were all last written over max_age
+    seconds ago
+
+    A running job rewrites its checkpoint every checkpoint_every frames,
+    so only abandoned jobs are removed.
+
+    Returns:
+        int: Number of checkpoints deleted
+    """
+    newest = {}
+    for name in os.listdir(checkpoint_dir):
+        suffix = next((s for s in CHECKPOINT_SUFFIXES if name.endswith(s)), None)
+        if suffix is None:
+            continue
+        try:
+            mtime = os.path.getmtime(os.path.join(checkpoint_dir, name))
+        except FileNotFoundError:
+            # removed by a job finishing meanwhile
+            continue
+        prefix = os.path.join(checkpoint_dir, name[:-len(suffix)])
+        newest[prefix] = max(newest.get(prefix, 0), mtime)
+
+    expired = [prefix for prefix, mtime in newest.items()
+               if time.time() - mtime > max_age]
+    for prefix in expired:
+        logger.info(f"Removing abandoned checkpoint {os.path.basename(prefix)}")
+        try:
+            remove_checkpoint(prefix)
+        except FileNotFoundError:
+            pass
+    return len(expired)
+
+
+def write_track(records, path, fmt='json'):
+    """
+    Save track records as track JSON or as the compact binary format
+
+    Args:
+        records: Records from track_records
+        path: Output path
+        fmt: "json" or "vtrk"
+    """
+    data = {'frames': records}
+    if fmt == 'vtrk':
+        with open(path, 'wb') as f:
+            f.write(trackfile.json_to_binary(data))
+    else:
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+def render_opencv(tracked, output_path, info, start_number=1):
+    """
+    Draw overlays in Python and encode with XVID, then re-encode to H.264
+
+    Args:
+        tracked: Iterable of (frame, box) from track_frames, at full resolution
+        output_path: Path of the final video
+        info: Video properties from probe_video
+        start_number: Counter value shown on the first frame
+
+    Returns:
+        int: Number of frames written
+    """
+    temp_output = tempfile.NamedTemporaryFile(delete=False, suffix='_temp.mp4')
+    temp_output.close()
+
+    fourcc = cv2.VideoWriter_fourcc(*'XVID')
+    writer = cv2.VideoWriter(temp_output.name, fourcc, info['fps'],
+                             (info['width'], info['height']))
+    if not writer.isOpened():
+        os.unlink(temp_output.name)
+        raise RuntimeError("Could not create video writer")
+
+    frame_count = 0
+    for frame, (x, y, w, h) in tracked:
+        frame_count += 1
+        cv2.rectangle(frame, (x, y), (x+w, y+h), BOX_COLOR, BOX_THICKNESS)
+        cv2.putText(frame, f'Frame: {frame_count + start_number - 1}', (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1, BOX_COLOR, 2)
+        writer.write(frame)
+    writer.release()
+
+    try:
+        logger.info("Re-encoding video for browser compatibility...")
+        subprocess.run(
+            ['ffmpeg', '-i', temp_output.name] + H264_ARGS +
+            ['-y', output_path],
+            check=True, capture_output=True, text=True)
+        os.unlink(temp_output.name)
+        logger.info("✓ Video re-encoded successfully")
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        logger.warning(f"FFmpeg encoding failed: {e}, using original")
+        shutil.move(temp_output.name, output_path)
+
+    return frame_count
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_filters():
+    """Names of the filters of the installed ffmpeg, empty without ffmpeg"""
+    try:
+        listing = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-filters'],
+            check=True, capture_output=True, text=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return frozenset()
+    # rows look like " T.C drawbox  V->V  Draw a colored box..."
+    return frozenset(
+        parts[1] for parts in map(str.split, listing.splitlines())
+        if len(parts) >= 3 and '->' in parts[2])
+
+
+def missing_render_filters():
+    """RENDER_FILTERS the installed ffmpeg lacks (checked once per process)"""
+    return [name for name in RENDER_FILTERS if name not in ffmpeg_filters()]
+
+
+def write_sendcmd(boxes, fps, path, target='drawbox@track'):
+    """
+    Write per-frame box geometry as an ffmpeg sendcmd script
+
+    Each command fires half a frame before its frame's timestamp so that
+    rounding in the container timebase cannot push it onto the next frame.
+    """
+    with open(path, 'w') as f:
+        for i, (x, y, w, h) in enumerate(boxes):
+            t = max(0.0, (i - 0.5) / fps)
+            f.write(f"{t:.6f} {target} x {x}, {target} y {y}, "
+                    f"{target} w {w}, {target} h {h};\n")
+
+
+def render_ffmpeg(video_path, boxes, output_path, info, start=0,
+                  start_number=None):
+    """
+    Draw overlays and encode H.264 in a single ffmpeg invocation
+
+    Box geometry is driven per frame through sendcmd into a drawbox filter,
+    and the frame counter comes from drawtext's own frame number. Only the
+    frames covered by boxes are decoded and encoded.
+
+    Args:
+        video_path: Path to input video
+        boxes: One [x, y, w, h] box per frame from track_video
+        output_path: Path of the final video
+        info: Video properties from probe_video
+        start: Index of the frame the first box belongs to
+        start_number: Counter value shown on the first frame, defaults to
+            the 1-indexed start frame
+
+    Returns:
+        int: Number of frames rendered
+    """
+    if not boxes:
+        raise ValueError("No boxes to render")
+    if start_number is None:
+        start_number = start + 1
+
+    cmd_file = tempfile.NamedTemporaryFile(delete=False, suffix='.cmd')
+    cmd_file.close()
+    try:
+        write_sendcmd(boxes, info['fps'], cmd_file.name)
+
+        x, y, w, h = boxes[0]
+        color = '0x{:02X}{:02X}{:02X}'.format(*BOX_COLOR[::-1])
+        filters = ','.join([
+            'setpts=PTS-STARTPTS',
+            f"sendcmd=f='{cmd_file.name}'",
+            f"drawbox@track=x={x}:y={y}:w={w}:h={h}"
+            f":color={color}:t={BOX_THICKNESS}",
+            f"drawtext=text='Frame\\: %{{eif\\:n+{start_number}\\:d}}'"
+            f":x=10:y=8:fontsize={FONT_SIZE}:fontcolor={color}",
+        ])
+
+        logger.info("Rendering overlays with ffmpeg...")
+        subprocess.run(
+            ['ffmpeg'] + seek_args(start, info['fps']) +
+            ['-i', video_path,
+             '-vf', filters,
+             '-frames:v', str(len(boxes)),
+             '-an'] + H264_ARGS + ['-y', output_path],
+            check=True, capture_output=True, text=True)
+    finally:
+        os.unlink(cmd_file.name)
+
+    return len(boxes)
+
+
+def process_video(tracker, video_path, bbox_x, bbox_y, bbox_w, bbox_h,
+                  render='opencv', decode_scale=1.0, profile='balanced',
+                  start_frame=None, end_frame=None, start_time=None,
+                  end_time=None, output='video', adaptive=False,
+                  checkpoint_dir=None, checkpoint_every=CHECKPOINT_EVERY,
+                  checkpoint_max_age=CHECKPOINT_MAX_AGE, decoder='inline',
+                  kernel_cache=None):
+    """
+    Process video with object tracking
+
+    The tracking engine behind /track in both servers.
+
+    Args:
+        tracker: TrackerSiamRPN instance
+        video_path: Path to input video
+        bbox_x, bbox_y, bbox_w, bbox_h: Bounding box coordinates
+        render: "opencv" draws overlays in Python and encodes twice,
+            "ffmpeg" runs a decode-only tracking pass and lets a single
+            ffmpeg invocation draw the overlays while encoding H.264
+        decode_scale: Resolution factor for the tracking pass (ffmpeg only)
+        profile: Tracker speed/accuracy profile (see siamrpn.PROFILES)
+        start_frame, end_frame: 0-indexed segment bounds, end included
+        start_time, end_time: Segment bounds in seconds, used when the
+            matching frame bound is not given. The bounding box refers to
+            the start frame and only the segment is decoded and encoded.
+        output: "video" renders the overlays; "json" and "vtrk" skip
+            rendering and return the track in the JSON schema or the
+            compact binary format (see trackfile.py)
+        adaptive: Shrink the search region while the target moves slowly
+        checkpoint_dir: Directory for checkpoints of the tracking pass. A
+            job that dies is resumed from its last checkpoint when the
+            same video is submitted again with the same settings, with
+            results identical to an uninterrupted run
+        checkpoint_every: Frames between checkpoints
+        checkpoint_max_age: Seconds after which checkpoints of other jobs
+            that were never resumed are deleted from checkpoint_dir
+        decoder: "inline" decodes in the tracking process, "process" in
+            a decoder process feeding a shared-memory frame ring
+        kernel_cache: Optional KernelCache, so re-running the same video
+            from the same start frame and box skips the exemplar pass
+
+    Returns:
+        tuple: (output_path, message, metadata)
+    """
+    try:
+        if output not in OUTPUT_FORMATS:
+            return None, f"Unknown output format '{output}'", None
+        if render not in RENDER_MODES:
+            return None, f"Unknown render mode '{render}'", None
+        if not 0 < decode_scale <= 1:
+            return None, "decode_scale must be in (0, 1]", None
+        if profile not in PROFILES:
+            return None, f"Unknown profile '{profile}'", None
+        if decoder not in DECODERS:
+            return None, f"Unknown decoder '{decoder}'", None
+        if output == 'video' and render == 'ffmpeg' and missing_render_filters():
+            return None, ("render=ffmpeg needs an ffmpeg build with the "
+                          f"{', '.join(missing_render_filters())} filter(s); "
+                          "use render=opencv"), None
+
+        tracker.set_profile(profile, adaptive_search=adaptive)
+
+        info = probe_video(video_path)
+        if info is None:
+            return None, "Could not open video file", None
+        width, height = info['width'], info['height']
+
+        logger.info(f"Video: {width}x{height} @ {info['fps']:.2f}fps, "
+                    f"{info['total_frames']} frames")
+
+        try:
+            start, count = frame_range(
+                info, start_frame, end_frame, start_time, end_time)
+        except ValueError as e:
+            return None, str(e), None
+
+        # Validate bounding box
+        if bbox_w <= 0 or bbox_h <= 0:
+            return None, "Invalid bounding box dimensions", None
+
+        if (bbox_x < 0 or bbox_y < 0 or
+            bbox_x + bbox_w > width or bbox_y + bbox_h > height):
+            return None, f"Bounding box out of bounds (frame: {width}x{height})", None
+
+        bbox = [bbox_x, bbox_y, bbox_w, bbox_h]
+
+        # the opencv renderer tracks at full resolution
+        scale = decode_scale if output != 'video' or render == 'ffmpeg' else 1.0
+        video_hash = None
+        if checkpoint_dir or kernel_cache is not None:
+            video_hash = file_hash(video_path)
+
+        checkpoint = None
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            prune_checkpoints(checkpoint_dir, checkpoint_max_age)
+            checkpoint = os.path.join(checkpoint_dir, checkpoint_key(
+                video_hash, bbox=bbox, start=start, count=count, scale=scale,
+                profile=profile, adaptive=adaptive))
+
+        # how this job's tracker was initialised, set by track_frames
+        init_info = {}
+        cache = {'init_info': init_info}
+        if kernel_cache is not None:
+            cache.update(kernel_cache=kernel_cache,
+                         cache_key=(video_hash, start, scale))
+
+        suffix = os.path.splitext(OUTPUT_FORMATS[output][1])[1]
+        final_output = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+        final_output.close()
+
+        if output != 'video':
+            records = track_records(
+                tracker, video_path, bbox, info, decode_scale, start, count,
+                checkpoint, checkpoint_every, decoder, **cache)
+            if not records:
+                os.unlink(final_output.name)
+                return None, "Could not read first frame", None
+            write_track(records, final_output.name, output)
+            frame_count = len(records)
+        elif render == 'ffmpeg':
+            boxes = track_video(
+                tracker, video_path, bbox, info, decode_scale, start, count,
+                checkpoint, checkpoint_every, decoder, **cache)
+            if not boxes:
+                os.unlink(final_output.name)
+                return None, "Could not read first frame", None
+            try:
+                frame_count = render_ffmpeg(
+                    video_path, boxes, final_output.name, info, start)
+            except (subprocess.CalledProcessError, FileNotFoundError) as e:
+                logger.warning(f"FFmpeg rendering failed: {e}, drawing with OpenCV")
+                render = 'opencv'
+                frame_count = render_opencv(
+                    zip(iter_frames(video_path, info, start=start,
+                                    count=count, decoder=decoder), boxes),
+                    final_output.name, info, start + 1)
+        elif checkpoint:
+            # checkpoint a decode-only pass, then draw in a second pass
+            boxes = track_video(
+                tracker, video_path, bbox, info, 1.0, start, count,
+                checkpoint, checkpoint_every, decoder, **cache)
+            if not boxes:
+                os.unlink(final_output.name)
+                return None, "Could not read first frame", None
+            frame_count = render_opencv(
+                zip(iter_frames(video_path, info, start=start, count=count,
+                                decoder=decoder), boxes),
+                final_output.name, info, start + 1)
+        else:
+            frames = iter_frames(video_path, info, start=start, count=count,
+                                 decoder=decoder)
+            frame_count = render_opencv(
+                track_frames(tracker, frames, bbox, info, **cache),
+                final_output.name, info, start + 1)
+            if frame_count == 0:
+                os.unlink(final_output.name)
+                return None, "Could not read first frame", None
+
+        if checkpoint:
+            remove_checkpoint(checkpoint)
+
+        metadata = {
+            'frames_processed': frame_count,
+            'start_frame': start,
+            'resolution': f"{width}x{height}",
+            'fps': int(info['fps']),
+            'render': render,
+            'profile': profile,
+            'output': output,
+            'adaptive': adaptive,
+            'decoder': decoder
+        }
+        if kernel_cache is not None:
+            metadata['kernel_cache'] = init_info['init']
+
+        return final_output.name, f"Successfully tracked {frame_count} frames", metadata
+
+    except Exception as e:
+        logger.error(f"Tracking error: {str(e)}")
+        return None, f"Error: {str(e)}", None
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""
+Prefetching image-sequence runner for got10k-style offline evaluation
+
+got10k's Tracker.track() opens every frame with PIL on the tracking thread,
+so evaluation over image-sequence datasets waits on disk and JPEG decoding.
+This runner decodes frames ahead of the tracker on a thread pool (OpenCV
+releases the GIL while decoding) into a fixed ring of reusable RGB buffers,
+and spreads sequences over worker processes.
+
+A dataset is a directory of sequences, each holding its frames as image
+files and a groundtruth.txt whose first line is the initial box, as in
+GOT-10k, OTB or LaSOT. An optional list.txt selects and orders them.
+Results use GOT-10k's layout, so got10k's ExperimentGOT10k.report() and
+the GOT-10k server accept them directly:
+
+    <result_dir>/<tracker>/<sequence>/<sequence>_001.txt   boxes, x,y,w,h
+    <result_dir>/<tracker>/<sequence>/<sequence>_time.txt  seconds per frame
+
+ExperimentGOT10k(..., result_dir='results') reads results from
+results/GOT-10k, which is the default result_dir here. For other
+experiments pass their directory, e.g. --result-dir results/OTB2015.
+
+As with got10k, sequences that already have results are skipped and the
+time file only covers init() and update(), not decoding.
+
+Usage:
+    python sequence_runner.py data/GOT-10k/val [--model model.pth]
+        [--result-dir results/GOT-10k] [--processes 2] [--threads 4] [--depth 8]
+        [--profile balanced] [--name SiamRPN]
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from siamrpn import TrackerSiamRPN, PROFILES
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# got10k's experiments add the dataset name to their result_dir
+RESULT_DIR = os.path.join('results', 'GOT-10k')
+
+
+def find_sequences(root):
+    """
+    List the sequences of a dataset directory
+
+    Returns:
+        list of (name, img_files, init_box)
+    """
+    list_file = os.path.join(root, 'list.txt')
+    if os.path.exists(list_file):
+        with open(list_file) as f:
+            names = [line.strip() for line in f if line.strip()]
+    else:
+        names = sorted(name for name in os.listdir(root)
+                       if os.path.exists(os.path.join(root, name, 'groundtruth.txt')))
+
+    sequences = []
+    for name in names:
+        seq_dir = os.path.join(root, name)
+        # LaSOT and friends keep frames in an img/ subdirectory
+        img_dir = os.path.join(seq_dir, 'img')
+        if not os.path.isdir(img_dir):
+            img_dir = seq_dir
+        img_files = sorted(
+            os.path.join(img_dir, filename) for filename in os.listdir(img_dir)
+            if filename.lower().endswith(IMAGE_EXTENSIONS))
+        with open(os.path.join(seq_dir, 'groundtruth.txt')) as f:
+            first = f.readline().replace('\t', ',').replace(' ', ',')
+        box = np.array([float(v) for v in first.split(',') if v], dtype=np.float64)
+        sequences.append((name, img_files, box))
+    return sequences
+
+
+def prefetch_frames(img_files, threads=4, depth=8):
+    """
+    Yield frames as RGB arrays, decoding up to `depth` frames ahead
+
+    Frames are converted into a ring of `depth` preallocated buffers, so a
+    yielded array is only valid until the next one is requested; copy it
+    to keep it.
+
+    Args:
+        img_files: Ordered image paths
+        threads: Decoder threads
+        depth: Frames decoded ahead, and number of buffers
+    """
+    buffers = [None] * depth
+
+    def load(index):
+        image = cv2.imread(img_files[index], cv2.IMREAD_COLOR)
+        if image is None:
+            raise IOError(f"Could not read {img_files[index]}")
+        slot = index % depth
+        if buffers[slot] is None or buffers[slot].shape != image.shape:
+            buffers[slot] = np.empty_like(image)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=buffers[slot])
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque(pool.submit(load, i)
+                        for i in range(min(depth, len(img_files))))
+        for index in range(len(img_files)):
+            frame = pending.popleft().result()
+            yield frame
+            # the consumer is done with this slot, refill it
+            if index + depth < len(img_files):
+                pending.append(pool.submit(load, index + depth))
+
+
+def track_sequence(tracker, img_files, box, threads=4, depth=8):
+    """
+    Prefetching equivalent of got10k's Tracker.track()
+
+    Returns:
+        tuple: (boxes, times) as numpy arrays of shape (N, 4) and (N,)
+    """
+    boxes = np.zeros((len(img_files), 4))
+    boxes[0] = box
+    times = np.zeros(len(img_files))
+
+    for f, image in enumerate(prefetch_frames(img_files, threads, depth)):
+        start_time = time.time()
+        if f == 0:
+            tracker.init(image, box)
+        else:
+            boxes[f, :] = tracker.update(image)
+        times[f] = time.time() - start_time
+
+    return boxes, times
+
+
+def record_file(result_dir, tracker_name, seq_name, repetition=1):
+    return os.path.join(result_dir, tracker_name, seq_name,
+                        '%s_%03d.txt' % (seq_name, repetition))
+
+
+def record(path, boxes, times):
+    """Write boxes and times in the same format as got10k's _record"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savetxt(path, boxes, fmt='%.3f', delimiter=',')
+    time_file = path[:path.rfind('_')] + '_time.txt'
+    np.savetxt(time_file, times[:, np.newaxis], fmt='%.8f', delimiter=',')
+
+
+# per-process state set up by _init_worker
+_worker = {}
+
+
+def _init_worker(net_path, tracker_args, options, torch_threads):
+    import torch
+    torch.set_num_threads(torch_threads)
+    _worker['tracker'] = TrackerSiamRPN(net_path=net_path, **tracker_args)
+    _worker['options'] = options
+
+
+def _run_sequence(job):
+    name, img_files, box, path = job
+    tracker = _worker['tracker']
+    start = time.time()
+    boxes, times = track_sequence(tracker, img_files, box, **_worker['options'])
+    record(path, boxes, times)
+    return name, len(img_files), time.time() - start, float(times.sum())
+
+
+def run(root, net_path='model.pth', result_dir=RESULT_DIR, processes=1,
+        threads=4, depth=8, name='SiamRPN', **tracker_args):
+    """
+    Track every sequence of a dataset directory and record the results
+
+    Args:
+        root: Dataset directory (see find_sequences)
+        net_path: Model weights
+        result_dir: Output directory, in GOT-10k's layout. The default is
+            where ExperimentGOT10k(result_dir='results') reads from
+        processes: Worker processes, each with its own tracker
+        threads, depth: Prefetching per worker (see prefetch_frames)
+        name: Tracker name in result_dir, e.g. one per profile
+        **tracker_args: Passed to TrackerSiamRPN, e.g. profile='fast'
+
+    Returns:
+        list of (name, frames, wall seconds, tracking seconds) for the
+        sequences that were run
+    """
+    jobs = []
+    for seq_name, img_files, box in find_sequences(root):
+        path = record_file(result_dir, name, seq_name)
+        if os.path.exists(path):
+            print(f'  Found results, skipping {seq_name}')
+            continue
+        jobs.append((seq_name, img_files, box, path))
+    if not jobs:
+        return []
+
+    options = {'threads': threads, 'depth': depth}
+    # share the cores between workers instead of oversubscribing them
+    torch_threads = max(1, (os.cpu_count() or 1) // processes)
+    initargs = (net_path, tracker_args, options, torch_threads)
+
+    done = []
+    # spawn, since forked workers cannot use CUDA
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(processes, _init_worker, initargs) as pool:
+        for i, result in enumerate(pool.imap_unordered(_run_sequence, jobs)):
+            seq_name, frames, wall, tracking = result
+            print(f'--Sequence {i + 1}/{len(jobs)}: {seq_name} '
+                  f'({frames} frames, {frames / wall:.1f} fps wall, '
+                  f'{frames / max(tracking, 1e-9):.1f} fps tracking)')
+            done.append(result)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('root', help='Dataset directory')
+    parser.add_argument('--model', default='model.pth')
+    parser.add_argument('--result-dir', default=RESULT_DIR)
+    parser.add_argument('--processes', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--profile', default='balanced', choices=list(PROFILES))
+    parser.add_argument('--name', default='SiamRPN',
+                        help='Tracker name in the result directory')
+    args = parser.parse_args()
+
+    start = time.time()
+    done = run(args.root, args.model, args.result_dir, args.processes,
+               args.threads, args.depth, args.name, profile=args.profile)
+    frames = sum(result[1] for result in done)
+    elapsed = time.time() - start
+    print(f'{len(done)} sequences, {frames} frames in {elapsed:.1f}s '
+          f'({frames / max(elapsed, 1e-9):.1f} fps)')
+
+
+if __name__ == '__main__':
+    main()
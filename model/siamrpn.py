@@ -9,6 +9,25 @@ from collections import namedtuple
 from got10k.trackers import Tracker
 
 
+# Named speed/accuracy trade-offs. `ratios` must be a subset of the ratios
+# the network was trained with; dropping ratios drops the matching anchors.
+PROFILES = {
+    'fast': {
+        'instance_sz': 239,
+        'small_instance_sz': 255,
+        'ratios': [0.5, 1, 2]},
+    'balanced': {
+        'instance_sz': 271,
+        'small_instance_sz': 287,
+        'ratios': [0.33, 0.5, 1, 2, 3]},
+    'accurate': {
+        'instance_sz': 303,
+        'small_instance_sz': 319,
+        'ratios': [0.33, 0.5, 1, 2, 3]}}
+
+TRAINED_RATIOS = [0.33, 0.5, 1, 2, 3]
+
+
 class SiamRPN(nn.Module):
 
     def __init__(self, anchor_num=5):
@@ -57,23 +76,44 @@ class SiamRPN(nn.Module):
 
         return kernel_reg, kernel_cls
 
-    def inference(self, x, kernel_reg, kernel_cls):
+    def inference(self, x, kernel_reg, kernel_cls, bias_reg=None):
         x = self.feature(x)
         x_reg = self.conv_reg_x(x)
         x_cls = self.conv_cls_x(x)
         
-        out_reg = self.adjust_reg(F.conv2d(x_reg, kernel_reg))
+        if bias_reg is None:
+            out_reg = self.adjust_reg(F.conv2d(x_reg, kernel_reg))
+        else:
+            out_reg = F.conv2d(x_reg, kernel_reg, bias_reg)
         out_cls = F.conv2d(x_cls, kernel_cls)
 
         return out_reg, out_cls
 
+    def select_anchors(self, kernel_reg, kernel_cls, anchor_ids):
+        # keep a subset of anchors; adjust_reg is a 1x1 conv, so it is
+        # folded into the regression kernel to drop the unused outputs
+        n = self.anchor_num
+        reg_ids = [c * n + a for c in range(4) for a in anchor_ids]
+        cls_ids = [c * n + a for c in range(2) for a in anchor_ids]
+
+        weight = self.adjust_reg.weight[reg_ids, :, 0, 0]
+        kernel_reg = torch.einsum('oi,ijhw->ojhw', weight, kernel_reg)
+        bias_reg = self.adjust_reg.bias[reg_ids]
+
+        return kernel_reg, kernel_cls[cls_ids], bias_reg
+
 
 class TrackerSiamRPN(Tracker):
 
     def __init__(self, net_path=None, **kargs):
         super(TrackerSiamRPN, self).__init__(
             name='SiamRPN', is_deterministic=True)
-        self.parse_args(**kargs)
+        # constructor settings, kept under every profile switch
+        self.init_args = {k: v for k, v in kargs.items() if k != 'profile'}
+        # anchors and hanning windows per search size, for the tracker's
+        # lifetime
+        self.grid_cache = {}
+        self.parse_args(profile=kargs.get('profile', 'balanced'))
 
         # setup GPU device if available
         self.cuda = torch.cuda.is_available()
@@ -86,21 +126,51 @@ class TrackerSiamRPN(Tracker):
                 net_path, map_location=lambda storage, loc: storage))
         self.net = self.net.to(self.device)
 
-    def parse_args(self, **kargs):
+    def parse_args(self, profile='balanced', **kargs):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown profile '{profile}'")
+        self.profile = profile
+        self.args = kargs
+
         self.cfg = {
             'exemplar_sz': 127,
             'instance_sz': 271,
+            'small_instance_sz': 287,
             'total_stride': 8,
             'context': 0.5,
             'ratios': [0.33, 0.5, 1, 2, 3],
             'scales': [8,],
             'penalty_k': 0.055,
             'window_influence': 0.42,
-            'lr': 0.295}
-
-        for key, val in kargs.items():
-            self.cfg.update({key: val})
+            'lr': 0.295,
+            # motion-adaptive search region
+            'adaptive_search': False,
+            'min_instance_sz': 207,
+            'motion_thresh': 0.1,
+            'motion_window': 5,
+            'shrink_score': 0.9,
+            'expand_score': 0.8}
+
+        self.cfg.update(PROFILES[profile])
+        # constructor settings, then the ones given for this profile
+        self.cfg.update(self.init_args)
+        self.cfg.update(kargs)
         self.cfg = namedtuple('GenericDict', self.cfg.keys())(**self.cfg)
+        self.base_cfg = self.cfg
+
+        # anchors kept from the trained set (None keeps all of them)
+        if list(self.cfg.ratios) == TRAINED_RATIOS:
+            self.anchor_ids = None
+        elif len(self.cfg.scales) == 1 and \
+                set(self.cfg.ratios) <= set(TRAINED_RATIOS):
+            self.anchor_ids = [TRAINED_RATIOS.index(r) for r in self.cfg.ratios]
+        else:
+            raise ValueError(
+                f"ratios must be a subset of {TRAINED_RATIOS} with one scale")
+
+    def set_profile(self, profile, **kargs):
+        if profile != self.profile or kargs != self.args:
+            self.parse_args(profile=profile, **kargs)
 
     def init(self, image, box):
         image = np.asarray(image)
@@ -111,29 +181,25 @@ class TrackerSiamRPN(Tracker):
             box[0] - 1 + (box[2] - 1) / 2,
             box[3], box[2]], dtype=np.float32)
         self.center, self.target_sz = box[:2], box[2:]
+        self.score = 1.0
 
         # for small target, use larger search region
+        self.cfg = self.base_cfg
         if np.prod(self.target_sz) / np.prod(image.shape[:2]) < 0.004:
-            self.cfg = self.cfg._replace(instance_sz=287)
+            self.cfg = self.cfg._replace(
+                instance_sz=self.cfg.small_instance_sz)
 
-        # generate anchors
-        self.response_sz = (self.cfg.instance_sz - \
-            self.cfg.exemplar_sz) // self.cfg.total_stride + 1
-        self.anchors = self._create_anchors(self.response_sz)
-
-        # create hanning window
-        self.hann_window = np.outer(
-            np.hanning(self.response_sz),
-            np.hanning(self.response_sz))
-        self.hann_window = np.tile(
-            self.hann_window.flatten(),
-            len(self.cfg.ratios) * len(self.cfg.scales))
+        # anchors and hanning window
+        self.search_sz = self.cfg.instance_sz
+        self.motion = []
+        self.response_sz, self.anchors, self.hann_window = \
+            self._create_grids(self.search_sz)
 
         # exemplar and search sizes
         context = self.cfg.context * np.sum(self.target_sz)
         self.z_sz = np.sqrt(np.prod(self.target_sz + context))
         self.x_sz = self.z_sz * \
-            self.cfg.instance_sz / self.cfg.exemplar_sz
+            self.search_sz / self.cfg.exemplar_sz
 
         # exemplar image
         self.avg_color = np.mean(image, axis=(0, 1))
@@ -147,6 +213,11 @@ class TrackerSiamRPN(Tracker):
         with torch.set_grad_enabled(False):
             self.net.eval()
             self.kernel_reg, self.kernel_cls = self.net.learn(exemplar_image)
+            self.bias_reg = None
+            if self.anchor_ids is not None:
+                self.kernel_reg, self.kernel_cls, self.bias_reg = \
+                    self.net.select_anchors(
+                        self.kernel_reg, self.kernel_cls, self.anchor_ids)
 
     def update(self, image):
         image = np.asarray(image)
@@ -154,7 +225,7 @@ class TrackerSiamRPN(Tracker):
         # search image
         instance_image = self._crop_and_resize(
             image, self.center, self.x_sz,
-            self.cfg.instance_sz, self.avg_color)
+            self.search_sz, self.avg_color)
 
         # classification and regression outputs
         instance_image = torch.from_numpy(instance_image).to(
@@ -162,28 +233,14 @@ class TrackerSiamRPN(Tracker):
         with torch.set_grad_enabled(False):
             self.net.eval()
             out_reg, out_cls = self.net.inference(
-                instance_image, self.kernel_reg, self.kernel_cls)
+                instance_image, self.kernel_reg, self.kernel_cls,
+                self.bias_reg)
         
-        # offsets
-        offsets = out_reg.permute(
-            1, 2, 3, 0).contiguous().view(4, -1).cpu().numpy()
-        offsets[0] = offsets[0] * self.anchors[:, 2] + self.anchors[:, 0]
-        offsets[1] = offsets[1] * self.anchors[:, 3] + self.anchors[:, 1]
-        offsets[2] = np.exp(offsets[2]) * self.anchors[:, 2]
-        offsets[3] = np.exp(offsets[3]) * self.anchors[:, 3]
-
-        # scale and ratio penalty
-        penalty = self._create_penalty(self.target_sz, offsets)
+        offsets, response = self._decode(out_reg, out_cls)
 
-        # response
-        response = F.softmax(out_cls.permute(
-            1, 2, 3, 0).contiguous().view(2, -1), dim=0).data[1].cpu().numpy()
-        response = response * penalty
-        response = (1 - self.cfg.window_influence) * response + \
-            self.cfg.window_influence * self.hann_window
-        
         # peak location
         best_id = np.argmax(response)
+        self.score = float(response[best_id])
         offset = offsets[:, best_id] * self.z_sz / self.cfg.exemplar_sz
 
         # update center
@@ -195,11 +252,15 @@ class TrackerSiamRPN(Tracker):
         self.target_sz = (1 - lr) * self.target_sz + lr * offset[2:][::-1]
         self.target_sz = np.clip(self.target_sz, 10, image.shape[:2])
 
+        # shrink or expand the search region for the next frame
+        if self.cfg.adaptive_search:
+            self._adapt_search(offset)
+
         # update exemplar and instance sizes
         context = self.cfg.context * np.sum(self.target_sz)
         self.z_sz = np.sqrt(np.prod(self.target_sz + context))
         self.x_sz = self.z_sz * \
-            self.cfg.instance_sz / self.cfg.exemplar_sz
+            self.search_sz / self.cfg.exemplar_sz
 
         # return 1-indexed and left-top based bounding box
         box = np.array([
@@ -209,6 +270,105 @@ class TrackerSiamRPN(Tracker):
 
         return box
 
+    def get_state(self):
+        """Everything update() depends on, with tensors moved to the CPU"""
+        return {
+            'profile': self.profile,
+            'args': dict(self.args),
+            'cfg': self.cfg._asdict(),
+            'center': self.center.copy(),
+            'target_sz': self.target_sz.copy(),
+            'score': self.score,
+            'search_sz': self.search_sz,
+            'motion': list(self.motion),
+            'z_sz': self.z_sz,
+            'x_sz': self.x_sz,
+            'avg_color': self.avg_color.copy(),
+            'kernel_reg': self.kernel_reg.cpu(),
+            'kernel_cls': self.kernel_cls.cpu(),
+            'bias_reg': None if self.bias_reg is None else self.bias_reg.cpu()}
+
+    def set_state(self, state):
+        """Restore a state from get_state, in place of init()"""
+        self.set_profile(state['profile'], **state['args'])
+        self.cfg = self.base_cfg._replace(**state['cfg'])
+        self.center = state['center'].copy()
+        self.target_sz = state['target_sz'].copy()
+        self.score = state['score']
+        self.search_sz = state['search_sz']
+        self.motion = list(state['motion'])
+        self.z_sz = state['z_sz']
+        self.x_sz = state['x_sz']
+        self.avg_color = state['avg_color'].copy()
+        self.kernel_reg = state['kernel_reg'].to(self.device)
+        self.kernel_cls = state['kernel_cls'].to(self.device)
+        self.bias_reg = None if state['bias_reg'] is None else \
+            state['bias_reg'].to(self.device)
+        self.response_sz, self.anchors, self.hann_window = \
+            self._create_grids(self.search_sz)
+
+    def _adapt_search(self, offset):
+        # displacement relative to target size, over the last few frames
+        motion = np.linalg.norm(offset[:2]) / np.sqrt(np.prod(self.target_sz))
+        self.motion = (self.motion + [motion])[-self.cfg.motion_window:]
+
+        search_sz = self.search_sz
+        if self.score < self.cfg.expand_score or \
+                motion > self.cfg.motion_thresh:
+            search_sz = self.cfg.instance_sz
+            self.motion = []
+        elif self.score > self.cfg.shrink_score and \
+                len(self.motion) == self.cfg.motion_window and \
+                max(self.motion) < self.cfg.motion_thresh:
+            # keep (search_sz - exemplar_sz) a multiple of the stride
+            search_sz = max(self.cfg.min_instance_sz,
+                            search_sz - 2 * self.cfg.total_stride)
+
+        if search_sz != self.search_sz:
+            self.search_sz = search_sz
+            self.response_sz, self.anchors, self.hann_window = \
+                self._create_grids(search_sz)
+
+    def _decode(self, out_reg, out_cls):
+        # offsets
+        offsets = out_reg.permute(
+            1, 2, 3, 0).contiguous().view(4, -1).cpu().numpy()
+        offsets[0] = offsets[0] * self.anchors[:, 2] + self.anchors[:, 0]
+        offsets[1] = offsets[1] * self.anchors[:, 3] + self.anchors[:, 1]
+        offsets[2] = np.exp(offsets[2]) * self.anchors[:, 2]
+        offsets[3] = np.exp(offsets[3]) * self.anchors[:, 3]
+
+        # scale and ratio penalty
+        penalty = self._create_penalty(self.target_sz, offsets)
+
+        # response
+        response = F.softmax(out_cls.permute(
+            1, 2, 3, 0).contiguous().view(2, -1), dim=0).data[1].cpu().numpy()
+        response = response * penalty
+        response = (1 - self.cfg.window_influence) * response + \
+            self.cfg.window_influence * self.hann_window
+
+        return offsets, response
+
+    def _create_grids(self, instance_sz):
+        key = (instance_sz, self.cfg.exemplar_sz, self.cfg.total_stride,
+               tuple(self.cfg.ratios), tuple(self.cfg.scales))
+        if key not in self.grid_cache:
+            response_sz = (instance_sz - self.cfg.exemplar_sz) // \
+                self.cfg.total_stride + 1
+            anchors = self._create_anchors(response_sz)
+
+            hann_window = np.outer(
+                np.hanning(response_sz),
+                np.hanning(response_sz))
+            hann_window = np.tile(
+                hann_window.flatten(),
+                len(self.cfg.ratios) * len(self.cfg.scales))
+
+            self.grid_cache[key] = (response_sz, anchors, hann_window)
+
+        return self.grid_cache[key]
+
     def _create_anchors(self, response_sz):
         anchor_num = len(self.cfg.ratios) * len(self.cfg.scales)
         anchors = np.zeros((anchor_num, 4), dtype=np.float32)
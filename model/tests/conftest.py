@@ -0,0 +1,59 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from siamrpn import SiamRPN, TrackerSiamRPN
+
+
+def target_frames(count, size=(160, 120), box=(60, 40, 30, 30), step=2):
+    """Noise frames with a bright square moving `step` px right per frame"""
+    width, height = size
+    rng = np.random.RandomState(0)
+    background = rng.randint(0, 96, (height, width, 3), dtype=np.uint8)
+    x, y, w, h = box
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        frame[y:y + h, x + i * step:x + i * step + w] = (40, 200, 240)
+        frames.append(frame)
+    return frames
+
+
+@pytest.fixture(scope='session')
+def net_path(tmp_path_factory):
+    """Seeded random weights with a damped regression head
+
+    model.pth is not in the tree. With plain random weights the box
+    regression explodes within a few frames; scaling adjust_reg keeps the
+    boxes finite, so runs stay comparable frame by frame.
+    """
+    torch.manual_seed(0)
+    net = SiamRPN()
+    with torch.no_grad():
+        net.adjust_reg.weight.mul_(1e-4)
+    path = tmp_path_factory.mktemp('model') / 'model.pth'
+    torch.save(net.state_dict(), path)
+    return str(path)
+
+
+@pytest.fixture
+def tracker(net_path):
+    return TrackerSiamRPN(net_path=net_path)
+
+
+@pytest.fixture(scope='session')
+def clip(tmp_path_factory):
+    """A 12-frame 160x120 MJPG clip of target_frames"""
+    path = str(tmp_path_factory.mktemp('clip') / 'clip.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10,
+                             (160, 120))
+    for frame in target_frames(12):
+        writer.write(frame)
+    writer.release()
+    return path
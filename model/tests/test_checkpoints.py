@@ -0,0 +1,109 @@
+import os
+import time
+
+import numpy as np
+import pytest
+import torch
+
+import pipeline
+from siamrpn import TrackerSiamRPN
+
+BBOX = (60, 40, 30, 30)
+
+MODES = {
+    'full_scale': {},
+    'half_scale_adaptive': {'decode_scale': 0.5, 'adaptive': True},
+    'fast_range': {'profile': 'fast', 'start_frame': 2, 'end_frame': 10},
+}
+
+
+class WorkerDied(Exception):
+    pass
+
+
+def run(tracker, clip, **options):
+    path, message, _ = pipeline.process_video(
+        tracker, clip, *BBOX, output='json', **options)
+    assert path is not None, message
+    with open(path, 'rb') as f:
+        data = f.read()
+    os.unlink(path)
+    return data
+
+
+def count_updates(tracker, die_after=None):
+    """Count tracker.update calls, raising WorkerDied after die_after"""
+    calls = []
+    update = tracker.update
+
+    def counted(image):
+        if len(calls) == die_after:
+            raise WorkerDied()
+        calls.append(1)
+        return update(image)
+
+    tracker.update = counted
+    return calls
+
+
+@pytest.mark.parametrize('options', MODES.values(), ids=MODES)
+def test_resume_is_bit_identical(net_path, clip, tmp_path, options):
+    uninterrupted = TrackerSiamRPN(net_path=net_path)
+    expected = run(uninterrupted, clip, **options)
+
+    checkpoints = str(tmp_path / 'checkpoints')
+    resumable = dict(options, checkpoint_dir=checkpoints, checkpoint_every=3)
+
+    # dies on the 8th frame, after the checkpoint at frame 6
+    tracker = TrackerSiamRPN(net_path=net_path)
+    count_updates(tracker, die_after=7)
+    path, message, _ = pipeline.process_video(
+        tracker, clip, *BBOX, output='json', **resumable)
+    assert path is None and 'Error' in message
+    assert any(name.endswith('.pt') for name in os.listdir(checkpoints))
+
+    # a new worker picks the job up at frame 6
+    tracker = TrackerSiamRPN(net_path=net_path)
+    calls = count_updates(tracker)
+    assert run(tracker, clip, **resumable) == expected
+    frames = expected.count(b'"frame"')
+    assert len(calls) == frames - 6
+    assert os.listdir(checkpoints) == []
+
+    # boxes are rounded to pixels in the output; the state must match too
+    resumed = tracker.get_state()
+    for key, value in uninterrupted.get_state().items():
+        if torch.is_tensor(value):
+            assert torch.equal(resumed[key], value), key
+        elif isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(resumed[key], value, err_msg=key)
+        else:
+            assert resumed[key] == value, key
+
+
+def test_checkpoint_loads_without_pickled_objects(tracker, clip, tmp_path):
+    info = pipeline.probe_video(clip)
+    checkpoint = str(tmp_path / 'job')
+    records = pipeline.track_records(
+        tracker, clip, list(BBOX), info, count=4, checkpoint=checkpoint,
+        checkpoint_every=4)
+    # pipeline.load_checkpoint uses weights_only=True
+    restored = TrackerSiamRPN()
+    assert pipeline.load_checkpoint(restored, checkpoint) == records
+    assert (restored.center == tracker.center).all()
+    assert restored.x_sz == tracker.x_sz
+
+
+def test_prune_checkpoints(tmp_path):
+    old = time.time() - pipeline.CHECKPOINT_MAX_AGE - 60
+    for name in ('stale.pt', 'stale.jsonl', 'orphan.pt.tmp', 'fresh.pt',
+                 'mixed.jsonl', 'mixed.pt', 'notes.txt'):
+        (tmp_path / name).write_text('')
+    for name in ('stale.pt', 'stale.jsonl', 'orphan.pt.tmp', 'mixed.jsonl',
+                 'notes.txt'):
+        os.utime(tmp_path / name, (old, old))
+
+    assert pipeline.prune_checkpoints(str(tmp_path)) == 2
+    # a checkpoint with any recent file is kept whole
+    assert sorted(os.listdir(tmp_path)) == \
+        ['fresh.pt', 'mixed.jsonl', 'mixed.pt', 'notes.txt']
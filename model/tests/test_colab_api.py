@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import colab_api
+import trackfile
+from kernel_cache import KernelCache
+
+BBOX = {'x': 60, 'y': 40, 'w': 30, 'h': 30}
+
+
+class VideoHandler(BaseHTTPRequestHandler):
+    """Serves the test clip, or `size` bytes without a Content-Length"""
+
+    clip = b''
+
+    def do_GET(self):
+        if self.path == '/clip':
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(self.clip)))
+            self.end_headers()
+            self.wfile.write(self.clip)
+        elif self.path.startswith('/unsized/'):
+            # HTTP/1.0 without Content-Length: the body ends at close
+            size = int(self.path.rsplit('/', 1)[1])
+            self.send_response(200)
+            self.end_headers()
+            for begin in range(0, size, 65536):
+                self.wfile.write(bytes(min(65536, size - begin)))
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server(clip):
+    with open(clip, 'rb') as f:
+        VideoHandler.clip = f.read()
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), VideoHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{httpd.server_port}'
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch, tracker):
+    monkeypatch.setattr(colab_api, 'tracker', tracker)
+    monkeypatch.setattr(colab_api, 'kernel_cache', KernelCache())
+    monkeypatch.setattr(colab_api, 'CHECKPOINT_DIR', None)
+    return colab_api.app.test_client()
+
+
+def test_download_streams_to_file(server, tmp_path):
+    path = tmp_path / 'video'
+    size = colab_api.download_video(f'{server}/clip', str(path))
+    assert size == len(VideoHandler.clip)
+    assert path.read_bytes() == VideoHandler.clip
+
+
+def test_download_rejects_content_length(server, tmp_path):
+    with pytest.raises(colab_api.DownloadTooLarge):
+        colab_api.download_video(f'{server}/clip', str(tmp_path / 'video'),
+                                 max_bytes=len(VideoHandler.clip) - 1)
+    # refused on the header alone, before the file is opened
+    assert not (tmp_path / 'video').exists()
+
+
+def test_download_stops_while_streaming(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(colab_api, 'DOWNLOAD_CHUNK_BYTES', 1024)
+    path = tmp_path / 'video'
+    with pytest.raises(colab_api.DownloadTooLarge):
+        colab_api.download_video(f'{server}/unsized/{1 << 20}', str(path),
+                                 max_bytes=10000)
+    assert path.stat().st_size <= 10000
+
+    assert colab_api.download_video(
+        f'{server}/unsized/10000', str(path), max_bytes=10000) == 10000
+
+
+@pytest.mark.parametrize('url', [
+    'file:///etc/passwd', 'ftp://127.0.0.1/video.mp4', 'video.mp4'])
+def test_download_rejects_other_schemes(url, tmp_path):
+    with pytest.raises(ValueError):
+        colab_api.download_video(url, str(tmp_path / 'video'))
+
+
+@pytest.mark.parametrize('path', ['/clip', f'/unsized/{1 << 20}'])
+def test_track_url_too_large(client, server, monkeypatch, path):
+    monkeypatch.setattr(colab_api, 'MAX_DOWNLOAD_BYTES', 10000)
+    response = client.post('/track-url', json={
+        'video_url': server + path, 'bbox': BBOX})
+    assert response.status_code == 413
+    assert 'larger than 10000 bytes' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('url', ['file:///etc/passwd', 'ftp://127.0.0.1/a.mp4'])
+def test_track_url_rejects_other_schemes(client, url):
+    response = client.post('/track-url', json={'video_url': url, 'bbox': BBOX})
+    assert response.status_code == 400
+    assert 'http(s)' in response.get_json()['error']
+
+
+def test_track_url_streams_track_data(client, server):
+    request = {'video_url': f'{server}/clip', 'bbox': BBOX, 'end_frame': 5}
+    response = client.post('/track-url', json=dict(request, output='json'))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers['X-Frames-Processed'] == '6'
+    assert response.headers['X-Kernel-Cache'] == 'miss'
+    track = json.loads(response.get_data())
+    assert [item['frame'] for item in track['frames']] == list(range(6))
+    assert track['frames'][0]['bbox'] == [60, 40, 30, 30]
+
+    response = client.post('/track-url', json=dict(request, output='vtrk'))
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == colab_api.pipeline.OUTPUT_FORMATS['vtrk'][0]
+    assert response.headers['X-Kernel-Cache'] == 'hit'
+    binary = trackfile.binary_to_json(response.get_data())
+    assert [item['frame'] for item in binary['frames']] == list(range(6))
+    for a, b in zip(binary['frames'], track['frames']):
+        assert a['bbox'] == [round(v) for v in b['bbox']]
+        assert a['visible'] == b['visible']
+
+
+def test_track_url_removes_download(client, server, monkeypatch):
+    created = []
+    real = colab_api.download_video
+
+    def download(url, path, max_bytes):
+        created.append(path)
+        return real(url, path, max_bytes)
+
+    monkeypatch.setattr(colab_api, 'download_video', download)
+    monkeypatch.setattr(colab_api, 'MAX_DOWNLOAD_BYTES', 10000)
+    client.post('/track-url', json={'video_url': f'{server}/clip', 'bbox': BBOX})
+    assert created and not os.path.exists(created[0])
+
+
+def test_track_url_rejects_ffmpeg_render_without_filters(client, server, monkeypatch):
+    monkeypatch.setattr(colab_api.pipeline, 'ffmpeg_filters',
+                        lambda: frozenset({'sendcmd', 'drawbox'}))
+    response = client.post('/track-url', json={
+        'video_url': f'{server}/clip', 'bbox': BBOX, 'render': 'ffmpeg'})
+    assert response.status_code == 400
+    assert 'drawtext' in response.get_json()['error']
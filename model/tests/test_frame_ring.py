@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import frame_ring
+import pipeline
+
+
+def decode(clip, decoder, **kargs):
+    info = pipeline.probe_video(clip)
+    return [frame.copy() for frame in pipeline.iter_frames(
+        clip, info, decoder=decoder, **kargs)]
+
+
+def test_process_decoder_matches_inline(clip):
+    inline = decode(clip, 'inline', start=3, count=6)
+    shared = decode(clip, 'process', start=3, count=6)
+    assert len(shared) == 6
+    assert all(np.array_equal(a, b) for a, b in zip(shared, inline))
+
+
+@pytest.mark.parametrize('free, slots', [
+    (None, frame_ring.DEFAULT_SLOTS),
+    (100 * 1000, frame_ring.DEFAULT_SLOTS),
+    (10 * 1000, 5),
+    (4 * 1000, 2),
+    (3 * 1000, 0)])
+def test_ring_slots_fit_free_shared_memory(monkeypatch, free, slots):
+    monkeypatch.setattr(frame_ring, 'shm_free_bytes', lambda: free)
+    assert frame_ring.ring_slots(1000) == slots
+
+
+def test_falls_back_to_inline_without_room(monkeypatch, clip, caplog):
+    monkeypatch.setattr(frame_ring, 'shm_free_bytes', lambda: 1000)
+    with pytest.raises(frame_ring.RingUnavailable):
+        next(frame_ring.iter_shared_frames(['cv2', clip, 0, None, None],
+                                           (120, 160, 3)))
+
+    frames = decode(clip, 'process', count=4)
+    assert all(np.array_equal(a, b)
+               for a, b in zip(frames, decode(clip, 'inline', count=4)))
+    assert len(frames) == 4
+    assert 'decoding in this process instead' in caplog.text
@@ -0,0 +1,77 @@
+import os
+
+import torch
+
+import pipeline
+from kernel_cache import KernelCache
+from siamrpn import TrackerSiamRPN
+
+from conftest import target_frames
+
+BBOX = (60, 40, 30, 30)
+
+
+def test_init_hit_restores_state(net_path):
+    frame = target_frames(1)[0]
+    cache = KernelCache()
+    first = TrackerSiamRPN(net_path=net_path)
+    assert cache.init(first, frame, BBOX, 'video') == 'miss'
+    second = TrackerSiamRPN(net_path=net_path)
+    assert cache.init(second, frame, BBOX, 'video') == 'hit'
+    assert torch.equal(first.kernel_reg, second.kernel_reg)
+    assert (first.center == second.center).all()
+
+    second.set_profile('fast')
+    assert cache.init(second, frame, BBOX, 'video') == 'miss'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+
+def test_reports_own_init_despite_concurrent_hits(tracker, clip):
+    cache = KernelCache()
+    frame = target_frames(1)[0]
+    cache.init(TrackerSiamRPN(), frame, BBOX, 'other video')
+
+    # another request hits the cache while this job tracks
+    update = tracker.update
+
+    def update_during_other_request(image):
+        cache.get(next(iter(cache.entries)))
+        return update(image)
+
+    tracker.update = update_during_other_request
+    path, message, metadata = pipeline.process_video(
+        tracker, clip, *BBOX, output='json', end_frame=2, kernel_cache=cache)
+    assert path is not None, message
+    os.unlink(path)
+    assert metadata['kernel_cache'] == 'miss'
+
+    path, _, metadata = pipeline.process_video(
+        tracker, clip, *BBOX, output='json', end_frame=2, kernel_cache=cache)
+    os.unlink(path)
+    assert metadata['kernel_cache'] == 'hit'
+
+
+def test_resumed_job_reports_resumed(net_path, clip, tmp_path):
+    cache = KernelCache()
+    options = {'output': 'json', 'end_frame': 5, 'kernel_cache': cache,
+               'checkpoint_dir': str(tmp_path), 'checkpoint_every': 2}
+
+    tracker = TrackerSiamRPN(net_path=net_path)
+    update = tracker.update
+    calls = []
+
+    def dies_on_4th_frame(image):
+        calls.append(1)
+        if len(calls) == 3:
+            raise RuntimeError('worker died')
+        return update(image)
+
+    tracker.update = dies_on_4th_frame
+    path, _, _ = pipeline.process_video(tracker, clip, *BBOX, **options)
+    assert path is None
+
+    path, message, metadata = pipeline.process_video(
+        TrackerSiamRPN(net_path=net_path), clip, *BBOX, **options)
+    assert path is not None, message
+    os.unlink(path)
+    assert metadata['kernel_cache'] == 'resumed'
@@ -0,0 +1,167 @@
+import os
+import subprocess
+
+import cv2
+import pytest
+
+import pipeline
+
+# trimmed `ffmpeg -hide_banner -filters` output, without drawtext
+FILTERS = """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  ..C = Command support
+  A = Audio input/output
+  V = Video input/output
+  N = Dynamic number and/or type of input/output
+  | = Source or sink filter
+ TSC aap               AA->A      Apply Affine Projection algorithm to first audio stream.
+ ... buffer            |->V       Buffer video frames, and make them accessible to the filterchain.
+ ... buffersink        V->|       Buffer video frames, and make them available to the end of the filter graph.
+ T.C drawbox           V->V       Draw a colored box on the input video.
+ ... scale             V->V       Scale the input video size and/or convert the image format.
+ ..C sendcmd           N->N       Send commands to filters.
+"""
+
+
+@pytest.fixture
+def ffmpeg_listing(monkeypatch):
+    """Make ffmpeg_filters() parse FILTERS instead of the installed ffmpeg"""
+    def run(cmd, **kwargs):
+        assert cmd == ['ffmpeg', '-hide_banner', '-filters']
+        return subprocess.CompletedProcess(cmd, 0, stdout=FILTERS, stderr='')
+
+    monkeypatch.setattr(pipeline.subprocess, 'run', run)
+    pipeline.ffmpeg_filters.cache_clear()
+    yield
+    pipeline.ffmpeg_filters.cache_clear()
+
+
+def test_write_sendcmd(tmp_path):
+    path = tmp_path / 'track.cmd'
+    pipeline.write_sendcmd([[10, 20, 30, 40], [11, 21, 31, 41], [12, 22, 32, 42]],
+                           25.0, path)
+    lines = path.read_text().splitlines()
+    assert lines == [
+        "0.000000 drawbox@track x 10, drawbox@track y 20, "
+        "drawbox@track w 30, drawbox@track h 40;",
+        "0.020000 drawbox@track x 11, drawbox@track y 21, "
+        "drawbox@track w 31, drawbox@track h 41;",
+        "0.060000 drawbox@track x 12, drawbox@track y 22, "
+        "drawbox@track w 32, drawbox@track h 42;"]
+
+
+def test_write_sendcmd_fires_half_a_frame_early(tmp_path):
+    path = tmp_path / 'track.cmd'
+    pipeline.write_sendcmd([[0, 0, 1, 1]] * 4, 30000 / 1001, path,
+                           target='drawbox@other')
+    times = [float(line.split()[0]) for line in path.read_text().splitlines()]
+    frame = 1001 / 30000
+    assert times[0] == 0.0
+    for i, t in enumerate(times[1:], 1):
+        assert (i - 1) * frame < t < i * frame
+        assert t == pytest.approx((i - 0.5) * frame, abs=1e-6)
+    assert path.read_text().count('drawbox@other') == 16
+
+
+def test_ffmpeg_filters_parses_listing(ffmpeg_listing):
+    assert pipeline.ffmpeg_filters() == {
+        'aap', 'buffer', 'buffersink', 'drawbox', 'scale', 'sendcmd'}
+    assert pipeline.missing_render_filters() == ['drawtext']
+
+
+def test_ffmpeg_filters_without_ffmpeg(monkeypatch):
+    def run(cmd, **kwargs):
+        raise FileNotFoundError(cmd[0])
+
+    monkeypatch.setattr(pipeline.subprocess, 'run', run)
+    pipeline.ffmpeg_filters.cache_clear()
+    try:
+        assert pipeline.ffmpeg_filters() == frozenset()
+        assert pipeline.missing_render_filters() == list(pipeline.RENDER_FILTERS)
+    finally:
+        pipeline.ffmpeg_filters.cache_clear()
+
+
+def test_ffmpeg_render_rejected_without_filters(ffmpeg_listing, tracker, clip):
+    output_path, message, metadata = pipeline.process_video(
+        tracker, clip, 60, 40, 30, 30, render='ffmpeg')
+    assert output_path is None and metadata is None
+    assert 'drawtext' in message and 'render=opencv' in message
+
+    # track data does not render, so it does not need the filters
+    output_path, _, metadata = pipeline.process_video(
+        tracker, clip, 60, 40, 30, 30, render='ffmpeg', output='json',
+        end_frame=2)
+    assert metadata['frames_processed'] == 3
+    os.unlink(output_path)
+
+
+def test_process_video_renders_every_frame(tracker, clip):
+    output_path, message, metadata = pipeline.process_video(
+        tracker, clip, 60, 40, 30, 30, output='video')
+    assert output_path is not None, message
+    try:
+        assert metadata['frames_processed'] == 12
+        assert metadata['render'] == 'opencv'
+        assert metadata['resolution'] == '160x120'
+
+        cap = cv2.VideoCapture(output_path)
+        frames = 0
+        while cap.read()[0]:
+            frames += 1
+        cap.release()
+        assert frames == 12
+    finally:
+        os.unlink(output_path)
+
+
+INFO = {'fps': 25.0, 'total_frames': 100}
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({}, (0, None)),
+    ({'start_time': 1.0}, (25, None)),
+    ({'start_time': 1.0, 'end_time': 2.0}, (25, 26)),
+    ({'end_time': 0.5}, (0, 13)),
+    # 0.03 * 25 = 0.75 rounds to frame 1
+    ({'start_time': 0.03, 'end_time': 0.03}, (1, 1)),
+])
+def test_frame_range_converts_times(kwargs, expected):
+    assert pipeline.frame_range(INFO, **kwargs) == expected
+
+
+def test_frame_range_converts_times_at_ntsc_rate():
+    info = {'fps': 30000 / 1001, 'total_frames': 1000}
+    # 10s is frame 299.7
+    assert pipeline.frame_range(info, start_time=10.0, end_time=20.0) == (300, 300)
+
+
+def test_frame_range_prefers_frames_over_times():
+    assert pipeline.frame_range(INFO, start_frame=10, start_time=3.0) == (10, None)
+    assert pipeline.frame_range(INFO, end_frame=20, end_time=3.0) == (0, 21)
+    assert pipeline.frame_range(INFO, start_frame=10, end_frame=20,
+                                start_time=0.0, end_time=0.1) == (10, 11)
+    # a frame bound of 0 still wins over a time bound
+    assert pipeline.frame_range(INFO, start_frame=0, start_time=3.0) == (0, None)
+
+
+def test_frame_range_clips_end_to_last_frame():
+    assert pipeline.frame_range(INFO, start_frame=90, end_frame=500) == (90, 10)
+    assert pipeline.frame_range(INFO, start_frame=99, end_time=60.0) == (99, 1)
+    # no clipping when the frame count is unknown
+    info = {'fps': 25.0, 'total_frames': 0}
+    assert pipeline.frame_range(info, start_frame=90, end_frame=500) == (90, 411)
+
+
+@pytest.mark.parametrize('kwargs, error', [
+    ({'start_frame': -1}, 'must not be negative'),
+    ({'start_time': -0.5}, 'must not be negative'),
+    ({'start_frame': 100}, r'past the last frame \(99\)'),
+    ({'start_time': 4.0}, r'past the last frame \(99\)'),
+    ({'start_frame': 10, 'end_frame': 9}, 'before its start'),
+    ({'start_time': 2.0, 'end_time': 1.0}, 'before its start'),
+])
+def test_frame_range_rejects_bad_ranges(kwargs, error):
+    with pytest.raises(ValueError, match=error):
+        pipeline.frame_range(INFO, **kwargs)
@@ -0,0 +1,139 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from got10k.experiments import ExperimentGOT10k
+
+import sequence_runner
+
+from conftest import target_frames
+
+BOX = [60, 40, 30, 30]
+
+
+def write_sequence(root, name, count, step=2):
+    seq_dir = os.path.join(root, name)
+    os.makedirs(seq_dir)
+    # PNG, so OpenCV and PIL decode the same pixels
+    for i, frame in enumerate(target_frames(count, step=step)):
+        cv2.imwrite(os.path.join(seq_dir, '%08d.png' % (i + 1)), frame)
+    with open(os.path.join(seq_dir, 'groundtruth.txt'), 'w') as f:
+        f.write(','.join(str(v) for v in BOX) + '\n')
+        f.write('0,0,0,0\n')
+    return seq_dir
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    root = str(tmp_path / 'dataset')
+    write_sequence(root, 'seq_b', 3, step=3)
+    write_sequence(root, 'seq_a', 4)
+    return root
+
+
+def test_find_sequences(dataset):
+    sequences = sequence_runner.find_sequences(dataset)
+    assert [name for name, _, _ in sequences] == ['seq_a', 'seq_b']
+    name, img_files, box = sequences[0]
+    assert [os.path.basename(path) for path in img_files] == \
+        ['%08d.png' % i for i in range(1, 5)]
+    assert box.tolist() == BOX
+
+    with open(os.path.join(dataset, 'list.txt'), 'w') as f:
+        f.write('seq_b\n')
+    assert [name for name, _, _ in sequence_runner.find_sequences(dataset)] == \
+        ['seq_b']
+
+
+def test_prefetch_frames_in_order(dataset):
+    _, img_files, _ = sequence_runner.find_sequences(dataset)[0]
+    frames = [frame.copy() for frame in sequence_runner.prefetch_frames(
+        img_files, threads=2, depth=2)]
+    expected = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                for frame in target_frames(4)]
+    assert all(np.array_equal(a, b) for a, b in zip(frames, expected))
+    assert len(frames) == 4
+
+
+def test_track_sequence_matches_tracker_track(tracker, dataset):
+    _, img_files, box = sequence_runner.find_sequences(dataset)[0]
+    expected, _ = tracker.track(img_files, box)
+    # a ring shorter than the sequence, so buffers are reused
+    boxes, times = sequence_runner.track_sequence(
+        tracker, img_files, box, threads=2, depth=2)
+    np.testing.assert_array_equal(boxes, expected)
+    assert times.shape == (4,) and (times > 0).all()
+
+
+def test_run_writes_got10k_layout(net_path, dataset, tmp_path):
+    result_dir = str(tmp_path / 'results')
+    done = sequence_runner.run(dataset, net_path, result_dir, processes=1,
+                               threads=2, depth=2, name='SiamRPN-test')
+    assert sorted((name, frames) for name, frames, _, _ in done) == \
+        [('seq_a', 4), ('seq_b', 3)]
+
+    for name, frames in (('seq_a', 4), ('seq_b', 3)):
+        seq_dir = os.path.join(result_dir, 'SiamRPN-test', name)
+        assert sorted(os.listdir(seq_dir)) == \
+            [f'{name}_001.txt', f'{name}_time.txt']
+        boxes = np.loadtxt(os.path.join(seq_dir, f'{name}_001.txt'),
+                           delimiter=',', ndmin=2)
+        times = np.loadtxt(os.path.join(seq_dir, f'{name}_time.txt'), ndmin=1)
+        assert boxes.shape == (frames, 4) and times.shape == (frames,)
+        assert boxes[0].tolist() == BOX
+
+
+def test_run_skips_existing_results(net_path, dataset, tmp_path):
+    result_dir = str(tmp_path / 'results')
+    existing = sequence_runner.record_file(result_dir, 'SiamRPN', 'seq_a')
+    os.makedirs(os.path.dirname(existing))
+    with open(existing, 'w') as f:
+        f.write('stale\n')
+
+    done = sequence_runner.run(dataset, net_path, result_dir, processes=1,
+                               threads=2, depth=2)
+    assert [name for name, _, _, _ in done] == ['seq_b']
+    with open(existing) as f:
+        assert f.read() == 'stale\n'
+
+    assert sequence_runner.run(dataset, net_path, result_dir) == []
+
+
+def write_got10k_val(root, name, count):
+    """A GOT-10k val sequence: JPEG frames, full groundtruth and meta"""
+    seq_dir = os.path.join(root, 'val', name)
+    os.makedirs(seq_dir)
+    for i, frame in enumerate(target_frames(count)):
+        cv2.imwrite(os.path.join(seq_dir, '%08d.jpg' % (i + 1)), frame)
+    np.savetxt(os.path.join(seq_dir, 'groundtruth.txt'),
+               [[BOX[0] + 2 * i, BOX[1], BOX[2], BOX[3]] for i in range(count)],
+               fmt='%.4f', delimiter=',')
+    for label in ('absence', 'cut_by_image'):
+        np.savetxt(os.path.join(seq_dir, label + '.label'),
+                   np.zeros(count), fmt='%d')
+    np.savetxt(os.path.join(seq_dir, 'cover.label'),
+               np.full(count, 8), fmt='%d')
+    with open(os.path.join(seq_dir, 'meta_info.ini'), 'w') as f:
+        f.write('[METAINFO]\nresolution: (160, 120)\n')
+    with open(os.path.join(root, 'val', 'list.txt'), 'a') as f:
+        f.write(name + '\n')
+
+
+def test_got10k_report_reads_default_results(net_path, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('MPLBACKEND', 'Agg')
+    root = str(tmp_path / 'GOT-10k')
+    write_got10k_val(root, 'GOT-10k_Val_000001', 3)
+    write_got10k_val(root, 'GOT-10k_Val_000002', 4)
+
+    done = sequence_runner.run(os.path.join(root, 'val'), net_path,
+                               processes=1, threads=2, depth=2)
+    assert len(done) == 2
+
+    experiment = ExperimentGOT10k(root, subset='val', result_dir='results',
+                                  report_dir='reports')
+    performance = experiment.report(['SiamRPN'])['SiamRPN']
+    assert sorted(performance['seq_wise']) == \
+        ['GOT-10k_Val_000001', 'GOT-10k_Val_000002']
+    assert 0 <= performance['overall']['ao'] <= 1
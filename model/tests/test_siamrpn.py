@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from siamrpn import PROFILES, TrackerSiamRPN
+
+from conftest import target_frames
+
+
+def test_constructor_args_survive_profile_switch(net_path):
+    tracker = TrackerSiamRPN(net_path=net_path, window_influence=0.3)
+    tracker.set_profile('fast', adaptive_search=True)
+    assert tracker.cfg.window_influence == 0.3
+    assert tracker.cfg.adaptive_search
+    assert tracker.cfg.instance_sz == PROFILES['fast']['instance_sz']
+
+    tracker.set_profile('balanced')
+    assert tracker.cfg.window_influence == 0.3
+    assert not tracker.cfg.adaptive_search
+
+
+def test_profile_args_override_constructor_args(net_path):
+    tracker = TrackerSiamRPN(net_path=net_path, profile='fast',
+                             window_influence=0.3)
+    assert tracker.profile == 'fast'
+    tracker.set_profile('fast', window_influence=0.2)
+    assert tracker.cfg.window_influence == 0.2
+
+
+def test_grid_cache_kept_across_profiles(tracker):
+    frame = target_frames(1)[0]
+    tracker.init(frame, [60, 40, 30, 30])
+    grids = tracker.grid_cache[next(iter(tracker.grid_cache))]
+
+    tracker.set_profile('fast')
+    tracker.init(frame, [60, 40, 30, 30])
+    tracker.set_profile('balanced')
+    tracker.init(frame, [60, 40, 30, 30])
+
+    assert len(tracker.grid_cache) == 2
+    assert tracker.grid_cache[next(iter(tracker.grid_cache))] is grids
+
+
+def adaptive_tracker(tracker):
+    tracker.set_profile('balanced', adaptive_search=True)
+    tracker.init(target_frames(1)[0], [60, 40, 30, 30])
+    return tracker
+
+
+def step(tracker, score, dx=0.0):
+    # offset in pixels; the target is 30x30, so dx=3 is a motion of 0.1
+    tracker.score = score
+    tracker._adapt_search(np.array([dx, 0.0, 0.0, 0.0]))
+    return tracker.search_sz
+
+
+def test_adapt_search_shrinks_after_motion_window(tracker):
+    t = adaptive_tracker(tracker)
+    full = t.cfg.instance_sz
+    sizes = [step(t, 0.95, dx=1) for _ in range(t.cfg.motion_window + 1)]
+    assert sizes[:-2] == [full] * (t.cfg.motion_window - 1)
+    assert sizes[-2:] == [full - 2 * t.cfg.total_stride,
+                          full - 4 * t.cfg.total_stride]
+
+
+def test_adapt_search_needs_confident_low_motion_frames(tracker):
+    t = adaptive_tracker(tracker)
+    full = t.cfg.instance_sz
+    # a score between expand_score and shrink_score neither shrinks nor resets
+    assert [step(t, 0.85) for _ in range(8)] == [full] * 8
+    assert len(t.motion) == t.cfg.motion_window
+
+    # motion at the threshold keeps the window full but blocks shrinking
+    for _ in range(t.cfg.motion_window):
+        step(t, 0.95, dx=3)
+    assert t.search_sz == full
+
+
+def test_adapt_search_stops_at_min_instance_sz(tracker):
+    t = adaptive_tracker(tracker)
+    sizes = [step(t, 0.95) for _ in range(30)]
+    assert min(sizes) == t.cfg.min_instance_sz
+    assert sizes[-1] == t.cfg.min_instance_sz
+    assert all((sz - t.cfg.exemplar_sz) % t.cfg.total_stride == 0
+               for sz in sizes)
+
+
+@pytest.mark.parametrize('score, dx', [(0.7, 0.0), (0.95, 4.0)])
+def test_adapt_search_resets(tracker, score, dx):
+    t = adaptive_tracker(tracker)
+    for _ in range(t.cfg.motion_window + 2):
+        step(t, 0.95)
+    assert t.search_sz < t.cfg.instance_sz
+
+    assert step(t, score, dx) == t.cfg.instance_sz
+    assert t.motion == []
+    # shrinking needs a full window again
+    assert step(t, 0.95) == t.cfg.instance_sz
+
+
+def test_adapt_search_uses_cached_grids(tracker):
+    t = adaptive_tracker(tracker)
+    seen = set()
+    for _ in range(10):
+        sz = step(t, 0.95)
+        seen.add(sz)
+        response_sz, anchors, hann_window = t._create_grids(sz)
+        assert t.response_sz == response_sz
+        assert t.response_sz == (sz - t.cfg.exemplar_sz) // t.cfg.total_stride + 1
+        assert t.anchors is anchors
+        assert t.hann_window is hann_window
+        assert len(t.anchors) == len(t.hann_window) == \
+            len(t.cfg.ratios) * len(t.cfg.scales) * response_sz ** 2
+    assert len(seen) > 1
+    assert all(key[0] in seen or key[0] == t.cfg.instance_sz
+               for key in t.grid_cache)
@@ -0,0 +1,159 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import trackfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+TRAIN_JSON = sorted(glob.glob(
+    os.path.join(ROOT, 'website', 'public', 'train-json', '*.json')))
+TRACK_FILE_TS = os.path.join(ROOT, 'website', 'app', 'lib', 'trackFile.ts')
+TYPESCRIPT = os.path.join(ROOT, 'website', 'node_modules', 'typescript')
+
+
+def frames(count, start=0, step=1, score=None, visible=True):
+    out = []
+    for i in range(count):
+        item = {'frame': start + i * step,
+                'bbox': [10 + i, 20 - i, 30 + 2 * i, 40],
+                'visible': visible if i % 3 else not visible}
+        if score is not None:
+            item['score'] = round(round(score * 255) / 255, 4)
+        out.append(item)
+    return out
+
+
+def round_trip(data, **kargs):
+    return trackfile.binary_to_json(trackfile.json_to_binary(data, **kargs))
+
+
+@pytest.mark.parametrize('path', TRAIN_JSON, ids=os.path.basename)
+def test_train_json_lossless(path):
+    with open(path) as f:
+        data = json.load(f)
+    assert round_trip(data) == data
+
+
+def test_train_json_present():
+    assert TRAIN_JSON
+
+
+def test_multi_track_with_chunks():
+    data = {'tracks': [
+        {'id': 3, 'frames': frames(50, score=0.8)},
+        {'id': 5, 'frames': frames(20, start=7, step=3)},
+        {'id': 9, 'frames': frames(9, score=0.25, visible=False)}]}
+    assert round_trip(data, chunk_size=8) == data
+
+
+def test_scores_kept_next_to_tracks_without_them():
+    scored = frames(4, score=0.6)
+    data = {'tracks': [{'id': 3, 'frames': scored},
+                       {'id': 7, 'frames': []},
+                       {'id': 8, 'frames': frames(3)}]}
+    tracks = trackfile.decode(trackfile.json_to_binary(data))
+    assert tracks[0]['frames'] == scored
+    assert tracks[1]['frames'] == []
+    assert 'score' not in tracks[2]['frames'][0]
+
+
+def test_wide_deltas():
+    data = {'frames': [
+        {'frame': 0, 'bbox': [0, 0, 10, 10], 'visible': True},
+        {'frame': 70000, 'bbox': [40000, -40000, 10, 10], 'visible': True},
+        {'frame': 70001, 'bbox': [40001, -40000, 12, 10], 'visible': False}]}
+    encoded = trackfile.json_to_binary(data)
+    assert trackfile.HEADER.unpack_from(encoded)[2] & trackfile.FLAG_WIDE
+    assert trackfile.binary_to_json(encoded) == data
+
+    narrow = trackfile.json_to_binary({'frames': frames(5)})
+    assert not trackfile.HEADER.unpack_from(narrow)[2] & trackfile.FLAG_WIDE
+
+
+def test_quantized_boxes():
+    data = {'frames': [
+        {'frame': i, 'bbox': [10.25 + i, 20.5, 30.75, 40.125], 'visible': True}
+        for i in range(5)]}
+    assert round_trip(data, quant=8) == data
+    assert round_trip(data, quant=4)['frames'][0]['bbox'] == [10.25, 20.5, 30.75, 40.0]
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        trackfile.decode(b'{"frames": []}' + bytes(20))
+
+
+NODE_DECODE = r"""
+const fs = require("fs");
+const ts = require(process.argv[2]);
+const source = fs.readFileSync(process.argv[3], "utf8");
+const js = ts.transpileModule(source, {
+  compilerOptions: {
+    module: ts.ModuleKind.CommonJS,
+    target: ts.ScriptTarget.ES2020,
+  },
+}).outputText;
+const mod = { exports: {} };
+new Function("module", "exports", "require", js)(mod, mod.exports, require);
+
+const bytes = fs.readFileSync(process.argv[4]);
+const buffer = bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length);
+
+// the same file, streamed in 7-byte pieces
+const stream = new ReadableStream({
+  start(controller) {
+    for (let i = 0; i < bytes.length; i += 7) {
+      controller.enqueue(new Uint8Array(bytes.subarray(i, i + 7)));
+    }
+    controller.close();
+  },
+});
+
+(async () => {
+  const chunks = [];
+  for await (const chunk of mod.exports.streamTrackChunks(new Response(stream))) {
+    chunks.push({
+      trackId: chunk.trackId,
+      frame: Array.from(chunk.frame),
+      score: chunk.score ? Array.from(chunk.score) : null,
+    });
+  }
+  process.stdout.write(JSON.stringify({
+    tracks: mod.exports.decodeTrackFile(buffer),
+    chunks,
+  }));
+})();
+"""
+
+
+@pytest.mark.skipif(
+    shutil.which('node') is None or not os.path.isdir(TYPESCRIPT),
+    reason="needs node and the website's dev dependencies (npm install)")
+def test_typescript_reader_matches_encoder(tmp_path):
+    data = {'tracks': [
+        {'id': 3, 'frames': frames(30, score=0.7)},
+        {'id': 7, 'frames': []},
+        {'id': 8, 'frames': [
+            {'frame': 5, 'bbox': [1.5, 2.25, 3, 4], 'visible': False},
+            {'frame': 90000, 'bbox': [50000.5, 2, 3, 4], 'visible': True}]}]}
+    path = tmp_path / 'track.vtrk'
+    path.write_bytes(trackfile.json_to_binary(data, quant=4, chunk_size=8))
+    script = tmp_path / 'decode.js'
+    script.write_text(NODE_DECODE)
+
+    out = json.loads(subprocess.run(
+        ['node', str(script), TYPESCRIPT, TRACK_FILE_TS, str(path)],
+        check=True, capture_output=True, text=True).stdout)
+
+    expected = trackfile.decode(path.read_bytes())
+    assert out['tracks'] == expected
+    streamed = {}
+    for chunk in out['chunks']:
+        streamed.setdefault(chunk['trackId'], []).extend(chunk['frame'])
+        assert (chunk['score'] is not None) == (chunk['trackId'] == 3)
+    assert streamed == {track['id']: [item['frame'] for item in track['frames']]
+                        for track in expected if track['frames']}
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+Compact binary track format (.vtrk) for VisioTrack
+
+A columnar alternative to the per-frame JSON in website/public/train-json
+for long videos and many targets. Rows are grouped into chunks of at most
+chunk_size rows that never span two targets. Inside a chunk every column
+is a little-endian typed array, so a browser can view them directly on an
+ArrayBuffer (or decode chunk by chunk while the file streams in):
+
+    header      '<4sBBHIII'  magic b'VTRK', version, flags, quant,
+                             track_count, chunk_count, row_count
+    track ids   uint32[track_count]
+    chunk table chunk_count x (track index, rows, byte offset, first frame,
+                chunk flags) as uint32
+    chunk       int32[5]     frame, x, y, w, h of the first row
+                uint16[rows] frame deltas      (uint32 with FLAG_WIDE)
+                int16[rows]  x, y, w, h deltas (int32 with FLAG_WIDE),
+                             one array per field
+                uint8[rows]  score * 255       (only if the chunk flags
+                                                have FLAG_SCORE)
+                uint8[...]   visible bitmap, least significant bit first
+                             padded so the next chunk is 4-byte aligned
+
+Box values are stored in units of 1/quant pixels; the first delta of a
+chunk is 0. Scores are stored per chunk, so a track without scores does
+not drop those of the others; the header's FLAG_SCORE is set when any
+chunk has them. Converting JSON with integer boxes (quant=1) and no
+scores is lossless in both directions; scores are quantized to 1/255.
+
+Usage:
+    python trackfile.py track.json track.vtrk
+    python trackfile.py track.vtrk track.json
+"""
+
+import json
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'VTRK'
+VERSION = 1
+
+FLAG_SCORE = 1
+FLAG_WIDE = 2
+
+HEADER = struct.Struct('<4sBBHIII')
+CHUNK_ENTRY = struct.Struct('<IIIII')
+
+
+def from_json(data):
+    """
+    Normalise track JSON to a list of tracks
+
+    Accepts the single-target schema {"frames": [...]} used by the website
+    and the multi-target form {"tracks": [{"id": ..., "frames": [...]}]}.
+
+    Returns:
+        list of {'id': int, 'frames': [{'frame', 'bbox', 'visible'[, 'score']}]}
+    """
+    if 'tracks' in data:
+        return [{'id': int(track.get('id', i)), 'frames': track['frames']}
+                for i, track in enumerate(data['tracks'])]
+    return [{'id': 0, 'frames': data['frames']}]
+
+
+def to_json(tracks):
+    """Inverse of from_json; a single track with id 0 uses the website schema"""
+    if len(tracks) == 1 and tracks[0]['id'] == 0:
+        return {'frames': tracks[0]['frames']}
+    return {'tracks': tracks}
+
+
+def _columns(frames, quant):
+    frame = np.array([item['frame'] for item in frames], dtype=np.int64)
+    boxes = np.array([item['bbox'] for item in frames],
+                     dtype=np.float64).reshape(-1, 4)
+    boxes = np.round(boxes * quant).astype(np.int64)
+    visible = np.array([item.get('visible', True) for item in frames],
+                       dtype=bool)
+    if all('score' in item for item in frames) and frames:
+        score = np.array([item['score'] for item in frames], dtype=np.float64)
+        score = np.round(np.clip(score, 0, 1) * 255).astype(np.uint8)
+    else:
+        score = None
+    return np.column_stack([frame, boxes]), visible, score
+
+
+def encode(tracks, quant=1, chunk_size=4096):
+    """
+    Encode tracks as .vtrk bytes
+
+    Args:
+        tracks: List of tracks as returned by from_json
+        quant: Box units per pixel (1 keeps integer pixels)
+        chunk_size: Maximum rows per chunk
+
+    Returns:
+        bytes
+    """
+    if not 1 <= quant <= 0xFFFF:
+        raise ValueError("quant must be in [1, 65535]")
+
+    chunks = []
+    for index, track in enumerate(tracks):
+        values, visible, score = _columns(track['frames'], quant)
+        for begin in range(0, len(values), chunk_size):
+            end = begin + chunk_size
+            chunks.append((index, values[begin:end], visible[begin:end],
+                           None if score is None else score[begin:end]))
+
+    for _, values, _, _ in chunks:
+        if np.abs(values).max() > 0x7FFFFFFF:
+            raise ValueError("Track values out of int32 range")
+        if np.diff(values[:, 0]).min(initial=0) < 0:
+            raise ValueError("Frames must be in increasing order within a track")
+
+    # narrow deltas unless some chunk needs the full range
+    wide = any(
+        np.diff(values[:, 0]).max(initial=0) > 0xFFFF or
+        np.abs(np.diff(values[:, 1:], axis=0)).max(initial=0) > 0x7FFF
+        for _, values, _, _ in chunks)
+
+    has_score = any(score is not None for _, _, _, score in chunks)
+    flags = (FLAG_SCORE if has_score else 0) | (FLAG_WIDE if wide else 0)
+    frame_dtype, box_dtype = ('<u4', '<i4') if wide else ('<u2', '<i2')
+
+    header_size = HEADER.size + 4 * len(tracks) + CHUNK_ENTRY.size * len(chunks)
+    header_size += -header_size % 4
+
+    body = bytearray()
+    table = []
+    for index, values, visible, score in chunks:
+        table.append(CHUNK_ENTRY.pack(
+            index, len(values), header_size + len(body), int(values[0, 0]),
+            FLAG_SCORE if score is not None else 0))
+        deltas = np.diff(values, axis=0, prepend=values[:1])
+        body += values[0].astype('<i4').tobytes()
+        body += deltas[:, 0].astype(frame_dtype).tobytes()
+        for column in range(1, 5):
+            body += deltas[:, column].astype(box_dtype).tobytes()
+        if score is not None:
+            body += score.tobytes()
+        body += np.packbits(visible, bitorder='little').tobytes()
+        body += bytes(-len(body) % 4)
+
+    rows = sum(len(values) for _, values, _, _ in chunks)
+    head = bytearray(HEADER.pack(
+        MAGIC, VERSION, flags, quant, len(tracks), len(chunks), rows))
+    head += np.array([track['id'] for track in tracks], dtype='<u4').tobytes()
+    head += b''.join(table)
+    head += bytes(header_size - len(head))
+
+    return bytes(head + body)
+
+
+def decode(data):
+    """
+    Decode .vtrk bytes into a list of tracks (see from_json)
+
+    Raises:
+        ValueError: If the data is not a supported .vtrk file
+    """
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise ValueError("Not a track file")
+    magic, version, flags, quant, track_count, chunk_count, _ = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a track file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported track file version {version}")
+
+    wide = flags & FLAG_WIDE
+    frame_dtype, box_dtype = ('<u4', '<i4') if wide else ('<u2', '<i2')
+    item = np.dtype(box_dtype).itemsize
+
+    ids = np.frombuffer(data, '<u4', track_count, HEADER.size)
+    tracks = [{'id': int(i), 'frames': []} for i in ids]
+
+    offset = HEADER.size + 4 * track_count
+    for _ in range(chunk_count):
+        index, rows, pos, _, chunk_flags = CHUNK_ENTRY.unpack_from(data, offset)
+        offset += CHUNK_ENTRY.size
+
+        base = np.frombuffer(data, '<i4', 5, pos).astype(np.int64)
+        pos += 20
+        columns = [np.frombuffer(data, frame_dtype, rows, pos)]
+        pos += rows * item
+        for _ in range(4):
+            columns.append(np.frombuffer(data, box_dtype, rows, pos))
+            pos += rows * item
+        values = np.cumsum(np.stack(columns, axis=1).astype(np.int64),
+                           axis=0) + base
+
+        score = None
+        if chunk_flags & FLAG_SCORE:
+            score = np.frombuffer(data, np.uint8, rows, pos)
+            pos += rows
+        visible = np.unpackbits(
+            np.frombuffer(data, np.uint8, (rows + 7) // 8, pos),
+            count=rows, bitorder='little').astype(bool)
+
+        frames = tracks[index]['frames']
+        for row in range(rows):
+            bbox = values[row, 1:] / quant if quant > 1 else values[row, 1:]
+            record = {
+                'frame': int(values[row, 0]),
+                'bbox': [v.item() for v in bbox],
+                'visible': bool(visible[row])}
+            if score is not None:
+                record['score'] = round(int(score[row]) / 255, 4)
+            frames.append(record)
+
+    return tracks
+
+
+def json_to_binary(data, **kargs):
+    """Encode track JSON (either schema) as .vtrk bytes"""
+    return encode(from_json(data), **kargs)
+
+
+def binary_to_json(data):
+    """Decode .vtrk bytes into track JSON"""
+    return to_json(decode(data))
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    src, dst = sys.argv[1:]
+    if src.endswith('.json'):
+        with open(src) as f:
+            out = json_to_binary(json.load(f))
+        with open(dst, 'wb') as f:
+            f.write(out)
+    else:
+        with open(src, 'rb') as f:
+            out = binary_to_json(f.read())
+        with open(dst, 'w') as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
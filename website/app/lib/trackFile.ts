@@ -0,0 +1,267 @@
+// Reader for the compact binary track format (.vtrk) written by
+// model/trackfile.py. See that module for the byte layout.
+
+export interface TrackFrame {
+  frame: number;
+  bbox: number[];
+  visible: boolean;
+  score?: number;
+}
+
+export interface Track {
+  id: number;
+  frames: TrackFrame[];
+}
+
+export interface TrackChunk {
+  trackId: number;
+  frame: Int32Array;
+  x: Float64Array;
+  y: Float64Array;
+  w: Float64Array;
+  h: Float64Array;
+  visible: Uint8Array;
+  score?: Float64Array;
+}
+
+interface ChunkEntry {
+  track: number;
+  rows: number;
+  offset: number;
+  firstFrame: number;
+  flags: number;
+}
+
+interface TrackFileHeader {
+  flags: number;
+  quant: number;
+  trackIds: number[];
+  chunks: ChunkEntry[];
+  rowCount: number;
+  size: number;
+}
+
+const MAGIC = "VTRK";
+const VERSION = 1;
+const FLAG_SCORE = 1;
+const FLAG_WIDE = 2;
+const HEADER_SIZE = 20;
+const CHUNK_ENTRY_SIZE = 20;
+
+function headerSize(view: DataView): number | null {
+  if (view.byteLength < HEADER_SIZE) return null;
+  const trackCount = view.getUint32(8, true);
+  const chunkCount = view.getUint32(12, true);
+  const size = HEADER_SIZE + 4 * trackCount + CHUNK_ENTRY_SIZE * chunkCount;
+  return size + ((4 - (size % 4)) % 4);
+}
+
+function readHeader(view: DataView): TrackFileHeader {
+  const magic = String.fromCharCode(
+    view.getUint8(0),
+    view.getUint8(1),
+    view.getUint8(2),
+    view.getUint8(3)
+  );
+  if (magic !== MAGIC) throw new Error("Not a track file");
+  const version = view.getUint8(4);
+  if (version !== VERSION) {
+    throw new Error(`Unsupported track file version ${version}`);
+  }
+
+  const trackCount = view.getUint32(8, true);
+  const chunkCount = view.getUint32(12, true);
+  const trackIds: number[] = [];
+  for (let i = 0; i < trackCount; i++) {
+    trackIds.push(view.getUint32(HEADER_SIZE + 4 * i, true));
+  }
+
+  const flags = view.getUint8(5);
+  const chunks: ChunkEntry[] = [];
+  let pos = HEADER_SIZE + 4 * trackCount;
+  for (let i = 0; i < chunkCount; i++, pos += CHUNK_ENTRY_SIZE) {
+    chunks.push({
+      track: view.getUint32(pos, true),
+      rows: view.getUint32(pos + 4, true),
+      offset: view.getUint32(pos + 8, true),
+      firstFrame: view.getUint32(pos + 12, true),
+      flags: view.getUint32(pos + 16, true),
+    });
+  }
+
+  return {
+    flags,
+    quant: view.getUint16(6, true),
+    trackIds,
+    chunks,
+    rowCount: view.getUint32(16, true),
+    size: headerSize(view) as number,
+  };
+}
+
+function chunkSize(header: TrackFileHeader, entry: ChunkEntry): number {
+  const { rows } = entry;
+  const item = header.flags & FLAG_WIDE ? 4 : 2;
+  let size = 20 + 5 * rows * item + Math.ceil(rows / 8);
+  if (entry.flags & FLAG_SCORE) size += rows;
+  return size + ((4 - (size % 4)) % 4);
+}
+
+// Typed-array views straight onto the chunk's bytes; only the running
+// sums of the deltas are materialised.
+function decodeChunk(
+  header: TrackFileHeader,
+  entry: ChunkEntry,
+  buffer: ArrayBuffer,
+  offset: number
+): TrackChunk {
+  const { rows } = entry;
+  const wide = header.flags & FLAG_WIDE;
+  const item = wide ? 4 : 2;
+  const base = new Int32Array(buffer, offset, 5);
+  let pos = offset + 20;
+
+  const frameDeltas = wide
+    ? new Uint32Array(buffer, pos, rows)
+    : new Uint16Array(buffer, pos, rows);
+  pos += rows * item;
+  const frame = new Int32Array(rows);
+  let acc = base[0];
+  for (let i = 0; i < rows; i++) {
+    acc += frameDeltas[i];
+    frame[i] = acc;
+  }
+
+  const boxes: Float64Array[] = [];
+  for (let c = 1; c < 5; c++) {
+    const deltas = wide
+      ? new Int32Array(buffer, pos, rows)
+      : new Int16Array(buffer, pos, rows);
+    pos += rows * item;
+    const out = new Float64Array(rows);
+    let value = base[c];
+    for (let i = 0; i < rows; i++) {
+      value += deltas[i];
+      out[i] = value / header.quant;
+    }
+    boxes.push(out);
+  }
+
+  let score: Float64Array | undefined;
+  if (entry.flags & FLAG_SCORE) {
+    const raw = new Uint8Array(buffer, pos, rows);
+    score = Float64Array.from(raw, (v) => v / 255);
+    pos += rows;
+  }
+
+  const bits = new Uint8Array(buffer, pos, Math.ceil(rows / 8));
+  const visible = new Uint8Array(rows);
+  for (let i = 0; i < rows; i++) {
+    visible[i] = (bits[i >> 3] >> (i & 7)) & 1;
+  }
+
+  return {
+    trackId: header.trackIds[entry.track],
+    frame,
+    x: boxes[0],
+    y: boxes[1],
+    w: boxes[2],
+    h: boxes[3],
+    visible,
+    score,
+  };
+}
+
+function appendChunk(tracks: Map<number, Track>, chunk: TrackChunk) {
+  const track = tracks.get(chunk.trackId) as Track;
+  for (let i = 0; i < chunk.frame.length; i++) {
+    const item: TrackFrame = {
+      frame: chunk.frame[i],
+      bbox: [chunk.x[i], chunk.y[i], chunk.w[i], chunk.h[i]],
+      visible: chunk.visible[i] === 1,
+    };
+    if (chunk.score) item.score = Math.round(chunk.score[i] * 1e4) / 1e4;
+    track.frames.push(item);
+  }
+}
+
+function emptyTracks(header: TrackFileHeader): Map<number, Track> {
+  return new Map(header.trackIds.map((id) => [id, { id, frames: [] }]));
+}
+
+// Decode a whole file, e.g. from `await response.arrayBuffer()`.
+export function decodeTrackFile(buffer: ArrayBuffer): Track[] {
+  const header = readHeader(new DataView(buffer));
+  const tracks = emptyTracks(header);
+  for (const entry of header.chunks) {
+    appendChunk(tracks, decodeChunk(header, entry, buffer, entry.offset));
+  }
+  return Array.from(tracks.values());
+}
+
+// Decode chunks as they arrive over the network.
+export async function* streamTrackChunks(
+  response: Response
+): AsyncGenerator<TrackChunk> {
+  if (!response.body) throw new Error("Response has no body");
+  const reader = response.body.getReader();
+
+  let pending = new Uint8Array(0);
+  let consumed = 0;
+  let header: TrackFileHeader | null = null;
+  let next = 0;
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (value) {
+      const joined = new Uint8Array(pending.length + value.length);
+      joined.set(pending);
+      joined.set(value, pending.length);
+      pending = joined;
+    }
+
+    if (!header) {
+      const size = headerSize(new DataView(pending.buffer));
+      if (size !== null && pending.length >= size) {
+        header = readHeader(new DataView(pending.buffer));
+        pending = pending.slice(size);
+        consumed = size;
+      }
+    }
+
+    while (header && next < header.chunks.length) {
+      const entry = header.chunks[next];
+      const start = entry.offset - consumed;
+      const end = start + chunkSize(header, entry);
+      if (pending.length < end) break;
+      // copy so the views start 4-byte aligned
+      const bytes = pending.slice(start, end);
+      yield decodeChunk(header, entry, bytes.buffer, 0);
+      pending = pending.slice(end);
+      consumed += end;
+      next++;
+    }
+
+    if (done) break;
+  }
+
+  if (!header || next < header.chunks.length) {
+    throw new Error("Track file ended early");
+  }
+}
+
+// Collect a streamed file into the JSON schema used by /train-json.
+// Targets without any rows are left out.
+export async function fetchTrackFile(url: string): Promise<Track[]> {
+  const response = await fetch(url);
+  if (!response.ok) throw new Error(`Failed to fetch ${url}`);
+
+  const tracks = new Map<number, Track>();
+  for await (const chunk of streamTrackChunks(response)) {
+    if (!tracks.has(chunk.trackId)) {
+      tracks.set(chunk.trackId, { id: chunk.trackId, frames: [] });
+    }
+    appendChunk(tracks, chunk);
+  }
+  return Array.from(tracks.values());
+}